@@ -10,6 +10,8 @@ SCRIPT_DIR="$ALADDIN_DIR/scripts"
 PY_MAIN="aladdin"
 ALADDIN_PLUGIN_DIR="/root/aladdin-plugins"
 ALADDIN_CONFIG_DIR="/root/aladdin-config"
+# Built by the aladdin python cli, see lib/manifest.py
+COMMAND_MANIFEST="$HOME/.aladdin/cache/command_manifest.json"
 
 # Export dirs/paths that are used by plugins/commands
 export ALADDIN_DIR
@@ -35,13 +37,28 @@ function source_cluster_env() {
 
 function exec_command_or_plugin() {
     # Execute a container command in order python command > bash command > container plugin
-    local plugin_path command_path
+    local plugin_path command_path kind target
+
+    if [[ $command == "--help" || $command == "-h" ]]; then
+        exec "$PY_MAIN" "$command" "$@"
+    fi
+
+    # The command manifest already resolved the precedence, a single lookup is enough
+    if [[ -f "$COMMAND_MANIFEST" ]]; then
+        read -r kind target <<< "$(jq -r --arg command "$command" \
+            '.commands[$command].container // empty | "\(.kind) \(.target)"' "$COMMAND_MANIFEST")"
+        case "${kind:-}" in
+            python) exec "$PY_MAIN" "$command" "$@" ;;
+            command) exec "$ALADDIN_DIR/$target" "$@" ;;
+            plugin) exec "$ALADDIN_PLUGIN_DIR/$target" "$@" ;;
+        esac
+    fi
 
     python_command_path="$ALADDIN_DIR/commands/${command//-/_}.py"
     bash_command_path="$ALADDIN_DIR/bash/container/$command/$command"
     plugin_path="$ALADDIN_PLUGIN_DIR/container/$command/$command"
 
-    if [[ -f "$python_command_path" || $command == "--help" || $command == "-h" ]]; then
+    if [[ -f "$python_command_path" ]]; then
         exec "$PY_MAIN" "$command" "$@"
     fi
 
@@ -158,6 +175,50 @@ function _add_authentication_user_to_kubeconfig() {
 EOT
 }
 
-source_cluster_env
-environment_init
-exec_command_or_plugin "$@"
+# Files used by the persistent container, see enter_persistent_container in aladdin.sh
+WARM_ENV_FILE="/tmp/aladdin-env.sh"
+READY_FILE="/tmp/aladdin-ready"
+ACTIVITY_FILE="/tmp/aladdin-last-used"
+SESSIONS_LOCK_FILE="/tmp/aladdin-sessions.lock"
+
+function run_persistent_container() {
+    # Save the configured environment for the commands run with "docker exec",
+    # then wait until the container has been idle for ALADDIN_IDLE_TIMEOUT seconds
+    export -p | grep -v -E '^declare -x (PWD|OLDPWD|SHLVL|HOSTNAME|INIT|SKIP_PROMPTS|command|ALADDIN_CONTAINER_MODE)=' \
+        > "$WARM_ENV_FILE"
+    touch "$ACTIVITY_FILE" "$SESSIONS_LOCK_FILE" "$READY_FILE"
+    echoerr "Persistent aladdin container ready"
+    while sleep 30; do
+        if ! flock -n -x "$SESSIONS_LOCK_FILE" true; then
+            # a command is still running
+            touch "$ACTIVITY_FILE"
+        elif [[ "$(( $(date +%s) - $(stat -c %Y "$ACTIVITY_FILE") ))" -gt "$ALADDIN_IDLE_TIMEOUT" ]]; then
+            echoerr "Persistent aladdin container idle for ${ALADDIN_IDLE_TIMEOUT}s, exiting"
+            exit 0
+        fi
+    done
+}
+
+case "${ALADDIN_CONTAINER_MODE:-}" in
+    daemon)
+        source_cluster_env
+        environment_init
+        run_persistent_container
+    ;;
+    exec)
+        touch "$ACTIVITY_FILE"
+        # hold a shared lock for as long as the command runs so the container isn't stopped
+        exec 9< "$SESSIONS_LOCK_FILE"
+        flock -s 9
+        source "$WARM_ENV_FILE"
+        if "$INIT"; then
+            environment_init
+        fi
+        exec_command_or_plugin "$@"
+    ;;
+    *)
+        source_cluster_env
+        environment_init
+        exec_command_or_plugin "$@"
+    ;;
+esac
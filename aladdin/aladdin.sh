@@ -18,6 +18,8 @@ KUBERNETES_VERSION="1.27.13"
 # Set key directory paths
 ALADDIN_DIR="$(cd "$(dirname "$0")" ; pwd)"
 SCRIPT_DIR="$ALADDIN_DIR/scripts"
+# Built by the aladdin python cli, see lib/manifest.py
+COMMAND_MANIFEST="$HOME/.aladdin/cache/command_manifest.json"
 
 ALADDIN_BIN="$HOME/.aladdin/bin"
 PATH="$ALADDIN_BIN":"$PATH"
@@ -63,7 +65,17 @@ function check_and_handle_init() {
 }
 
 function exec_host_command() {
-    local command_path
+    # Execute a host command or plugin, resolved from the command manifest if possible
+    local command_path kind target
+
+    if [[ -f "$COMMAND_MANIFEST" ]]; then
+        read -r kind target <<< "$(jq -r --arg command "$command" \
+            '.commands[$command].host // empty | "\(.kind) \(.target)"' "$COMMAND_MANIFEST")"
+        case "${kind:-}" in
+            command) exec "$ALADDIN_DIR/$target" "$@" ;;
+            plugin) [[ -n "$ALADDIN_PLUGIN_DIR" ]] && exec "$ALADDIN_PLUGIN_DIR/$target" "$@" ;;
+        esac
+    fi
 
     command_path="$ALADDIN_DIR/bash/host/$command/$command"
     if [[ -x "$command_path" ]]; then
@@ -109,6 +121,9 @@ function prepare_volume_mount_options() {
         VOLUME_MOUNTS_OPTIONS="$VOLUME_MOUNTS_OPTIONS -v $(pathnorm $ALADDIN_PLUGIN_DIR):/root/aladdin-plugins"
     fi
 
+    # the working directory changes from one command to the next, keep it separate from the
+    # mounts so a persistent container can be reused from any directory
+    WORKDIR_OPTIONS=""
     if [ "$ALADDIN_DEV" = true ] || [ "$IS_LOCAL" = true ]; then
         if [[ -f "$HOME/.aladdin/config/config.json" ]]; then
             HOST_DIR=$(jq -r .host_dir $HOME/.aladdin/config/config.json)
@@ -118,7 +133,7 @@ function prepare_volume_mount_options() {
             fi
         fi
         VOLUME_MOUNTS_OPTIONS="$VOLUME_MOUNTS_OPTIONS -v $HOST_DIR:/aladdin_root$HOST_DIR"
-        VOLUME_MOUNTS_OPTIONS="$VOLUME_MOUNTS_OPTIONS -w /aladdin_root$(pathnorm "$PWD")"
+        WORKDIR_OPTIONS="-w /aladdin_root$(pathnorm "$PWD")"
     fi
 }
 
@@ -174,38 +189,131 @@ function prepare_ssh_options() {
     fi
 }
 
+function prepare_docker_options() {
+    # Options shared by "docker run" and the persistent container
+    DOCKER_OPTIONS=(
+        `# Environment`
+        -e "ALADDIN_DEV=$ALADDIN_DEV"
+        -e "CLUSTER_CODE=$CLUSTER_CODE"
+        -e "NAMESPACE=$NAMESPACE"
+        -e "IS_LOCAL=$IS_LOCAL"
+        -e "IS_PROD=$IS_PROD"
+        -e "IS_TESTING=$IS_TESTING"
+        -e "HOST_ADDR=$HOST_ADDR"
+        `# Environment resolved by the aladdin cli, see env.py`
+        -e "ALADDIN_ENV_SNAPSHOT=/root/.aladdin/cache/env_snapshot_${CLUSTER_CODE}_${NAMESPACE}.json"
+        `# Mount host credentials`
+        -v "$(pathnorm ~/.aws):/root/.aws"
+        -v "$(pathnorm ~/.kube):/root/.kube_local"
+        -v "$(pathnorm ~/.aladdin):/root/.aladdin"
+        -v "$(pathnorm $ALADDIN_CONFIG_DIR):/root/aladdin-config"
+        -v /var/run/docker.sock:/var/run/docker.sock
+        ${VOLUME_MOUNTS_OPTIONS}
+        ${SSH_OPTIONS}
+    )
+}
+
 function enter_docker_container() {
     if "$IS_PROD" && ! "$SKIP_PROMPTS"; then
         confirm_production
     fi
 
+    if "$(jq -r '.persistent_container.enabled // false' $HOME/.aladdin/config/config.json)"; then
+        enter_persistent_container "$@"
+    fi
+
     FLAGS="--privileged --rm -it"
 
     docker run $FLAGS \
-        `# Environment` \
-        -e "ALADDIN_DEV=$ALADDIN_DEV" \
+        "${DOCKER_OPTIONS[@]}" \
         -e "INIT=$INIT" \
-        -e "CLUSTER_CODE=$CLUSTER_CODE" \
-        -e "NAMESPACE=$NAMESPACE" \
-        -e "IS_LOCAL=$IS_LOCAL" \
-        -e "IS_PROD=$IS_PROD" \
-        -e "IS_TESTING=$IS_TESTING" \
         -e "SKIP_PROMPTS=$SKIP_PROMPTS" \
-        -e "HOST_ADDR=$HOST_ADDR" \
+        -e "ALADDIN_TRACE=${ALADDIN_TRACE:-false}" \
         -e "command=$command" \
-        `# Mount host credentials` \
-        -v "$(pathnorm ~/.aws):/root/.aws" \
-        -v "$(pathnorm ~/.kube):/root/.kube_local" \
-        -v "$(pathnorm ~/.aladdin):/root/.aladdin" \
-        -v "$(pathnorm $ALADDIN_CONFIG_DIR):/root/aladdin-config" \
-        -v /var/run/docker.sock:/var/run/docker.sock \
-        ${VOLUME_MOUNTS_OPTIONS} \
-        ${SSH_OPTIONS} \
+        ${WORKDIR_OPTIONS} \
         "$ALADDIN_IMAGE" \
         `# Finally, launch the command` \
         /root/aladdin/aladdin/aladdin-container.sh "$@"
 }
 
+function persistent_container_fingerprint() {
+    # Changes whenever the persistent container needs to be restarted:
+    # new aladdin image, new config repo revision or cluster config, different mounts
+    {
+        docker image inspect -f '{{.Id}}' "$ALADDIN_IMAGE"
+        git -C "$ALADDIN_CONFIG_DIR" rev-parse HEAD 2> /dev/null || true
+        cat "$ALADDIN_CONFIG_DIR/$CLUSTER_CODE/env.sh" "$ALADDIN_CONFIG_DIR/$CLUSTER_CODE/config.json" \
+            "$ALADDIN_CONFIG_DIR/default/config.json" "$ALADDIN_CONFIG_DIR/config.json" 2> /dev/null || true
+        printf '%s\n' "${DOCKER_OPTIONS[@]}"
+    } | cksum | cut -d ' ' -f 1
+}
+
+function start_persistent_container() {
+    local name="$1" fingerprint="$2" idle_timeout
+
+    idle_timeout="$(jq -r '.persistent_container.idle_timeout // 1800' $HOME/.aladdin/config/config.json)"
+    echoerr "Starting persistent aladdin container $name"
+    docker run --privileged -d \
+        --name "$name" \
+        --label "aladdin.persistent=true" \
+        --label "aladdin.fingerprint=$fingerprint" \
+        "${DOCKER_OPTIONS[@]}" \
+        -e "INIT=false" \
+        -e "SKIP_PROMPTS=$SKIP_PROMPTS" \
+        -e "ALADDIN_CONTAINER_MODE=daemon" \
+        -e "ALADDIN_IDLE_TIMEOUT=$idle_timeout" \
+        "$ALADDIN_IMAGE" \
+        /root/aladdin/aladdin/aladdin-container.sh > /dev/null
+}
+
+function wait_for_persistent_container() {
+    # Wait until the container environment is configured, returns 1 if it failed to start.
+    # Poll the ready file, a docker health check would only run after a full interval
+    local name="$1"
+    while true; do
+        if docker exec "$name" test -f /tmp/aladdin-ready &> /dev/null; then
+            return 0
+        fi
+        if [[ "$(docker inspect -f '{{.State.Running}}' "$name" 2> /dev/null || true)" != "true" ]]; then
+            return 1
+        fi
+        sleep 0.5
+    done
+}
+
+function enter_persistent_container() {
+    # Run the command in a long lived container for this cluster/namespace,
+    # the container keeps its configured environment (credentials, kubeconfig...) between commands
+    local name fingerprint status
+    name="aladdin_${CLUSTER_CODE}_${NAMESPACE}"
+    fingerprint="$(persistent_container_fingerprint)"
+
+    status="$(docker inspect -f '{{.State.Running}} {{index .Config.Labels "aladdin.fingerprint"}}' \
+        "$name" 2> /dev/null || true)"
+    if [[ "$status" != "true $fingerprint" ]]; then
+        # stopped (idle timeout), outdated or missing
+        docker rm -f "$name" &> /dev/null || true
+        start_persistent_container "$name" "$fingerprint"
+    fi
+
+    if ! wait_for_persistent_container "$name"; then
+        echoerr "Persistent aladdin container $name failed to start, falling back to a new container"
+        docker logs "$name" >&2 || true
+        docker rm -f "$name" &> /dev/null || true
+        return 0
+    fi
+
+    exec docker exec -it \
+        -e "INIT=$INIT" \
+        -e "SKIP_PROMPTS=$SKIP_PROMPTS" \
+        -e "ALADDIN_TRACE=${ALADDIN_TRACE:-false}" \
+        -e "command=$command" \
+        -e "ALADDIN_CONTAINER_MODE=exec" \
+        ${WORKDIR_OPTIONS} \
+        "$name" \
+        /root/aladdin/aladdin/aladdin-container.sh "$@"
+}
+
 command="-h" # default command is help
 while [[ $# -gt 0 ]]; do
     case "$1" in
@@ -223,6 +331,12 @@ while [[ $# -gt 0 ]]; do
         --skip-prompts)
             SKIP_PROMPTS=true
         ;;
+        --refresh-config)
+            # handled by the python cli before the config repo is used
+        ;;
+        --trace)
+            # exported as ALADDIN_TRACE by the python cli
+        ;;
         *)
             command="$1"
             shift
@@ -238,4 +352,5 @@ exec_host_plugin "$@"
 check_and_handle_init
 prepare_volume_mount_options
 prepare_ssh_options
+prepare_docker_options
 enter_docker_container "$@"
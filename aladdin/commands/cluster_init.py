@@ -1,7 +1,6 @@
 from aladdin.lib.cluster_rules import ClusterRules
 from aladdin.commands import deploy
-from aladdin.lib.k8s.helm import Helm
-from aladdin.lib.arg_tools import container_command
+from aladdin.lib.arg_tools import add_deploy_pool_arguments, container_command
 
 
 def parse_args(sub_parser):
@@ -18,32 +17,19 @@ def parse_args(sub_parser):
         action="store_true",
         help="don't check if cluster init projects are already installed before installing",
     )
+    add_deploy_pool_arguments(subparser)
     subparser.set_defaults(func=cluster_init_args)
 
 
 def cluster_init_args(args):
-    cluster_init(args.force)
+    cluster_init(args.force, args.jobs, args.continue_on_error)
 
 
 @container_command
-def cluster_init(force=False):
-    helm = Helm()
-    cluster_init_projects = ClusterRules().cluster_init
-    for project in cluster_init_projects:
-        project_name = project["project"]
-        ref = project["ref"]
-        project_namespace = project["namespace"]
-        repo = project.get("repo") or project_name
-        if not force and helm.release_exists(
-            f"{project_name}-{project_namespace}", project_namespace
-        ):
-            continue
-        deploy.deploy(
-            project_name,
-            ref,
-            project_namespace,
-            dry_run=False,
-            force=True,
-            repo=repo,
-            set_override_values=[],
-        )
+def cluster_init(force=False, jobs=1, continue_on_error=False):
+    deploy.deploy_projects(
+        ClusterRules().cluster_init,
+        force=force,
+        jobs=jobs,
+        continue_on_error=continue_on_error,
+    )
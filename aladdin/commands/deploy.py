@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import functools
 import logging
 import os
 import sys
@@ -11,6 +12,7 @@ from aladdin.lib.cluster_rules import ClusterRules
 from aladdin.commands import sync_ingress
 from aladdin.config import load_git_configs
 from aladdin.lib.arg_tools import expand_namespace
+from aladdin.lib import process_pool
 from aladdin.lib.helm_rules import HelmRules
 from aladdin.lib.git import Git, clone_and_checkout
 from aladdin.lib.k8s.helm import Helm
@@ -50,7 +52,8 @@ def deploy(
     force_helm=False,
     repo=None,
     set_override_values: typing.List[str] = None,
-    values_files=None
+    values_files=None,
+    skip_ingress_sync=False,
 ):
     chart = chart or project
     repo = repo or project
@@ -70,7 +73,7 @@ def deploy(
         )
         sys.exit(1)
 
-    with clone_and_checkout(git_ref, repo, cwd=True):
+    with clone_and_checkout(git_ref, repo, cwd=True, sparse=True):
         helm_chart_path = ProjectConf().get_helm_chart_path(chart)
 
         helm_args = [
@@ -82,6 +85,19 @@ def deploy(
         # Update with --set-override-values
         values = dict(value.split("=") for value in set_override_values)
 
+        # the aladdin:// values are rendered (by helm-values) from the chart's values files,
+        # the values files of the cluster, the aladdin values and the image tag
+        digest = helm.deploy_digest(
+            helm_chart_path,
+            cr.values_files,
+            namespace,
+            helm_args,
+            {
+                **HelmRules.get_helm_values(),
+                **{alias: git_ref for alias in ProjectConf().get_image_tag_aliases()},
+                **values,
+            },
+        )
         helm.upgrade(
             HelmRules.get_release_name(chart),
             helm_chart_path,
@@ -89,7 +105,77 @@ def deploy(
             force=force_helm,
             dry_run=dry_run,
             helm_args=helm_args,
+            digest=digest,
             **values,
         )
-        if not dry_run:
+        if not dry_run and not skip_ingress_sync:
             sync_ingress.sync_ingress(namespace)
+
+
+def deploy_projects(projects, force=False, jobs=1, continue_on_error=False):
+    """
+    Deploy the cluster_init/namespace_init projects that aren't installed yet (or all of
+    them with force), up to "jobs" at a time
+
+    projects: dicts with "project", "ref", "namespace" and the optional "repo" and
+    "depends_on" (the names of the projects to deploy first)
+    """
+    helm = Helm()
+    # resolve the refs of every project at once rather than one deploy at a time
+    Git.prefetch_refs(
+        Git.get_url(project.get("repo") or project["project"]) for project in projects
+    )
+
+    # a project can be deployed to several namespaces by cluster-init
+    release_names = {}
+    for project in projects:
+        release_name = f"{project['project']}-{project['namespace']}"
+        release_names.setdefault(project["project"], []).append(release_name)
+
+    tasks = []
+    for project in projects:
+        project_name = project["project"]
+        namespace = project["namespace"]
+        release_name = f"{project_name}-{namespace}"
+        unknown = [name for name in project.get("depends_on", []) if name not in release_names]
+        if unknown:
+            logging.error(f"{project_name} depends on unknown projects: {', '.join(unknown)}")
+            sys.exit(1)
+
+        func = None
+        if force or not helm.release_exists(release_name, namespace):
+            func = functools.partial(
+                deploy,
+                project_name,
+                project["ref"],
+                namespace,
+                dry_run=False,
+                force=True,
+                repo=project.get("repo") or project_name,
+                set_override_values=[],
+                skip_ingress_sync=True,
+            )
+        depends_on = [
+            name for dependency in project.get("depends_on", [])
+            for name in release_names[dependency]
+        ]
+        tasks.append(process_pool.Task(release_name, func, depends_on))
+
+    try:
+        results = process_pool.run(tasks, jobs=jobs, continue_on_error=continue_on_error)
+    except process_pool.DependencyError as e:
+        logging.error(f"Invalid depends_on: {e}")
+        sys.exit(1)
+
+    # sync the ingresses once all the projects of a namespace are deployed
+    for namespace in sorted({
+        project["namespace"]
+        for project, result in zip(projects, results)
+        if result.status == process_pool.SUCCEEDED
+    }):
+        sync_ingress.sync_ingress(namespace)
+
+    logging.info("Deploy results:")
+    process_pool.log_summary(results)
+    if any(result.status == process_pool.FAILED for result in results):
+        sys.exit(1)
@@ -36,7 +36,7 @@ def parse_args(sub_parser):
     subparser.set_defaults(func=environment_args)
 
 
-@container_command
+@container_command(native=lambda args: args.command == "get")
 def environment_args(args):
     if args.command == "set":
         env_set(args.app, args.args, args.refresh, args.namespace)
@@ -2,13 +2,14 @@ import argparse
 import logging
 import os
 import subprocess
+import sys
 from contextlib import suppress
 from typing import Optional
 from urllib.parse import parse_qsl, urlparse
 
 import yaml
 
-from aladdin import env
+from aladdin import __version__, config, env
 from aladdin.config import PROJECT_ROOT, load_git_configs
 from aladdin.lib.arg_tools import (
     CHART_OPTION_PARSER,
@@ -16,11 +17,14 @@ from aladdin.lib.arg_tools import (
     container_command,
     expand_namespace,
 )
+from aladdin.lib.cache import HelmValuesCache
 from aladdin.lib.cluster_rules import ClusterRules
 from aladdin.lib.git import Git, clone_and_checkout
 from aladdin.lib.helm_rules import HelmRules
+from aladdin.lib.k8s import values_merge
 from aladdin.lib.k8s.helm import Helm
 from aladdin.lib.project_conf import ProjectConf
+from aladdin.lib.repo_state import RepoState
 from aladdin.lib.utils import strtobool, working_directory
 
 
@@ -33,7 +37,9 @@ def parse_args(sub_parser):
     )
     parser.set_defaults(func=helm_values)
     parser.add_argument(
-        "uri", help="aladdin://CLUSTER_CODE/REPO_NAME?chart=chart_name&git-ref=ref"
+        "uri",
+        nargs="?",
+        help="aladdin://CLUSTER_CODE/REPO_NAME?chart=chart_name&git-ref=ref",
     )
     parser.add_argument(
         "--git-ref",
@@ -54,18 +60,39 @@ def parse_args(sub_parser):
         dest="output",
         default=None,
     )
+    parser.add_argument(
+        "--no-cache",
+        help="compute the values even if they are cached",
+        dest="use_cache",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--purge-cache",
+        help="remove all the cached values and exit",
+        action="store_true",
+    )
 
 
-@container_command
+@container_command(native=True)
 @expand_namespace
 def helm_values(
     namespace: str,
-    uri: str,
+    uri: str = None,
     git_ref: str = None,
     chart: str = None,
     all_values: bool = True,
     output: str = None,
+    use_cache: bool = True,
+    purge_cache: bool = False,
 ):
+    if purge_cache:
+        HelmValuesCache().purge()
+        logging.info("Purged the helm values cache")
+        return
+    if not uri:
+        logging.error("the uri argument is required")
+        sys.exit(1)
+
     uri = urlparse(uri)
     params = dict(parse_qsl(uri.query, keep_blank_values=True))
     os.environ["CLUSTER_CODE"] = uri.netloc
@@ -81,14 +108,23 @@ def helm_values(
             params["all"] = "true"
         all_values = strtobool(params.get("all"))
 
-    with clone_and_checkout(git_ref, repo_name, debug=HelmRules.debug) as repo_dir:
-        current_chart_name = get_current_chart_name()
+    chart_name = chart or params.get("chart") or get_current_chart_name()
+    cache = HelmValuesCache()
+    # with HELM_DEBUG the values can come from uncommitted changes, don't cache them
+    cache_key = None
+    if use_cache and not HelmRules.debug:
+        cache_key = _cache_key(namespace, repo_name, git_ref, chart_name, all_values)
+        values = cache.get(cache_key)
+        if values is not None:
+            logging.info("Using cached values for %s at %s", repo_name or "project", git_ref)
+            _write_values(values, output)
+            return
+
+    with clone_and_checkout(
+        git_ref, repo_name, debug=HelmRules.debug, sparse=True
+    ) as repo_dir:
         with working_directory(repo_dir):
-            chart_path = os.path.abspath(
-                ProjectConf().get_helm_chart_path(
-                    chart or params.get("chart") or current_chart_name
-                )
-            )
+            chart_path = os.path.abspath(ProjectConf().get_helm_chart_path(chart_name))
             command = [
                 "helm",
                 "template",
@@ -112,17 +148,92 @@ def helm_values(
                 **HelmRules.get_helm_values(),
             )
 
-            logging.info("Executing: %s", " ".join(command))
-            result = subprocess.run(
-                command,
-                capture_output=output is not None,
-                check=True,
-                encoding="utf-8",
+            values = _render_values(command)
+    if cache_key:
+        with suppress(OSError):
+            cache.put(cache_key, values)
+    _write_values(values, output)
+
+
+def _render_values(command: list) -> str:
+    """
+    Merge the values in process, or with "helm template" (command) when
+    ALADDIN_VALUES_ENGINE=helm or when the values need helm (e.g. aladdin.templateValues).
+    ALADDIN_VALUES_ENGINE=compare runs both, warns if they differ and uses helm's values.
+    """
+    engine = os.getenv("ALADDIN_VALUES_ENGINE", "native")
+    values = None
+    if engine in ["native", "compare"]:
+        try:
+            # command is "helm template <merger chart> <args>"
+            values = values_merge.render(command[3:])
+        except (values_merge.UnsupportedValues, OSError, yaml.YAMLError) as e:
+            logging.info("Merging the values with helm: %s", e)
+        if engine == "native" and values is not None:
+            return values
+
+    logging.info("Executing: %s", " ".join(command))
+    helm_values = subprocess.run(
+        command,
+        capture_output=True,
+        check=True,
+        encoding="utf-8",
+    ).stdout
+    if engine == "compare" and values is not None:
+        if yaml.safe_load(values) != yaml.safe_load(helm_values):
+            logging.warning(
+                "The values merged by aladdin differ from helm's:\n%s\nhelm:\n%s",
+                values,
+                helm_values,
             )
-            if output:
-                with open(output, "w") as outputfile:
-                    outputfile.write(result.stdout)
-                logging.info("Values saved in: %s", output)
+    return helm_values
+
+
+def _cache_key(namespace, repo_name, git_ref, chart_name, all_values) -> dict:
+    """Everything the values are computed from, other than the content of the repo at git_ref"""
+    if not repo_name:
+        with suppress(subprocess.CalledProcessError):
+            repo_name = Git.get_repo_name()
+    cluster = os.environ["CLUSTER_CODE"]
+    config_dir = os.getenv("ALADDIN_CONFIG_DIR")
+    config_state = RepoState.current(config_dir) if config_dir else None
+    config_values = [
+        os.path.join(config_dir, *parts, "values.yaml")
+        for parts in [["default"], [cluster], [cluster, "namespace-overrides", namespace]]
+    ] if config_dir else []
+    return {
+        "aladdin_version": __version__,
+        "cluster": cluster,
+        "namespace": namespace,
+        "repo": repo_name,
+        "git_ref": git_ref,
+        "chart": chart_name,
+        "all_values": all_values,
+        "config_commit": config_state and config_state.head,
+        # local changes to the aladdin config
+        "config_revision": config.cluster_config_revision(cluster, namespace),
+        "config_values": [_file_signature(path) for path in config_values],
+        "values_files": ClusterRules(namespace=namespace).values_files,
+        "helm_values": HelmRules.get_helm_values(),
+    }
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _write_values(values: str, output: str = None):
+    if output:
+        with open(output, "w") as outputfile:
+            outputfile.write(values)
+        logging.info("Values saved in: %s", output)
+    else:
+        sys.stdout.write(values)
+        sys.stdout.flush()
 
 
 def get_current_chart_name() -> Optional[str]:
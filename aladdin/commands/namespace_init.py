@@ -1,7 +1,8 @@
-from aladdin.lib.arg_tools import add_namespace_argument, container_command
+from aladdin.lib.arg_tools import (
+    add_deploy_pool_arguments, add_namespace_argument, container_command
+)
 from aladdin.lib.cluster_rules import ClusterRules
 from aladdin.commands import deploy
-from aladdin.lib.k8s.helm import Helm
 
 
 def parse_args(sub_parser):
@@ -19,29 +20,20 @@ def parse_args(sub_parser):
         help="don't check if namespace init projects are already installed before installing",
     )
     add_namespace_argument(subparser)
+    add_deploy_pool_arguments(subparser)
     subparser.set_defaults(func=namespace_init_args)
 
 
 def namespace_init_args(args):
-    namespace_init(args.namespace, args.force)
+    namespace_init(args.namespace, args.force, args.jobs, args.continue_on_error)
 
 
 @container_command
-def namespace_init(namespace, force=False):
-    helm = Helm()
+def namespace_init(namespace, force=False, jobs=1, continue_on_error=False):
     namespace_init_projects = ClusterRules(namespace=namespace).namespace_init
-    for project in namespace_init_projects:
-        project_name = project["project"]
-        ref = project["ref"]
-        repo = project.get("repo") or project_name
-        if not force and helm.release_exists(f"{project_name}-{namespace}", namespace):
-            continue
-        deploy.deploy(
-            project_name,
-            ref,
-            namespace,
-            dry_run=False,
-            force=True,
-            repo=repo,
-            set_override_values=[],
-        )
+    deploy.deploy_projects(
+        [dict(project, namespace=namespace) for project in namespace_init_projects],
+        force=force,
+        jobs=jobs,
+        continue_on_error=continue_on_error,
+    )
@@ -16,7 +16,7 @@ def scale_args(args):
     scale(args.deployment, args.replicas, args.namespace)
 
 
-@container_command
+@container_command(native=True)
 def scale(deployment, replicas, namespace=None):
     k = Kubernetes(namespace=namespace)
 
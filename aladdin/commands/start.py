@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import functools
 import os
 
 from aladdin.lib.arg_tools import (
@@ -51,7 +52,6 @@ def start(
         charts = [os.path.basename(chart_path) for chart_path in pc.get_helm_chart_paths()]
 
     values = HelmRules.get_helm_values()
-    helm_args = []
     values.update({
         "deploy.imageTag": "local",
         "deploy.ecr": "",
@@ -59,20 +59,29 @@ def start(
     # Update with --set-override-values
     values.update(dict(value.split("=") for value in set_override_values))
 
+    def upgrade(chart_path):
+        # each chart gets its own helm arguments
+        helm_args = [
+            f"--values={path}"
+            for path in helm.find_values(chart_path, cr.values_files, namespace)
+        ]
+        # Add user-specified values files
+        for file_path in values_files or []:
+            helm_args.append(f"--values={os.path.join(chart_path, 'values', file_path)}")
+        release_name = HelmRules.get_release_name(os.path.basename(chart_path))
+        digest = helm.deploy_digest(chart_path, cr.values_files, namespace, helm_args, values)
+        return functools.partial(
+            helm.upgrade, release_name, chart_path, namespace, force=force_helm,
+            dry_run=dry_run, helm_args=helm_args, digest=digest, **values
+        )
+
     try:
-        for chart_path in pc.get_helm_chart_paths():
-            chart_name = os.path.basename(chart_path)
-            # Add user-specified values files
-            if values_files:
-                for file_path in values_files:
-                    helm_args.append(f"--values={os.path.join(chart_path, 'values', file_path)}")
-            if chart_name in charts:
-                release_name = HelmRules.get_release_name(chart_name)
-                helm.upgrade(
-                    release_name, chart_path, cr.values_files, namespace,
-                    force=force_helm, dry_run=dry_run, helm_args=helm_args, **values
-                )
+        helm.run_concurrently({
+            os.path.basename(chart_path): upgrade(chart_path)
+            for chart_path in pc.get_helm_chart_paths()
+            if os.path.basename(chart_path) in charts
+        })
     finally:
-        # Sync if any helm.start() call succeeded, even if a subsequent one failed
+        # Sync once all the charts are started, even if one of them failed
         if not dry_run:
             sync_ingress.sync_ingress(namespace)
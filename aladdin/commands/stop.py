@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import functools
 import os
 
 from aladdin.lib.arg_tools import CHARTS_OPTION_PARSER, COMMON_OPTION_PARSER, container_command
@@ -33,13 +34,17 @@ def stop(namespace, charts):
 
     sync_required = False
     try:
-        for chart_path in pc.get_helm_chart_paths():
-            chart_name = os.path.basename(chart_path)
-            if chart_name in charts:
-                release_name = HelmRules.get_release_name(chart_name)
-                helm.stop(release_name, namespace)
-                sync_required = True
+        releases = {
+            chart_name: HelmRules.get_release_name(chart_name)
+            for chart_name in map(os.path.basename, pc.get_helm_chart_paths())
+            if chart_name in charts
+        }
+        sync_required = bool(releases)
+        helm.run_concurrently({
+            chart_name: functools.partial(helm.stop, release_name, namespace)
+            for chart_name, release_name in releases.items()
+        })
     finally:
-        # Sync if any helm.stop() call succeeded, even if a subsequent one failed
+        # Sync once all the charts are stopped, even if one of them failed
         if sync_required:
             sync_ingress.sync_ingress(namespace)
@@ -1,4 +1,5 @@
 import logging
+import shutil
 
 from aladdin.lib.arg_tools import add_namespace_argument, container_command
 from aladdin.lib.k8s.kubernetes import Kubernetes
@@ -48,7 +49,8 @@ def tail_args(args):
     tail(args.container, args.color, args.deployment, args.pod, args.namespace)
 
 
-@container_command
+# kubetail.sh needs stdbuf (from GNU coreutils) to stream the logs
+@container_command(native=lambda *args, **kwargs: bool(shutil.which("stdbuf")))
 def tail(container_name, color, deployment_name, pod_name, namespace=None):
     k = Kubernetes(namespace=namespace)
     deployment, pod = None, None
@@ -57,9 +59,8 @@ def tail(container_name, color, deployment_name, pod_name, namespace=None):
             pod = choose_pod(k)
             pod_name = pod.metadata.name
         else:
-            try:
-                pod = k.get_pod_by_name(pod_name)
-            except IndexError:
+            pod = k.get_pod_by_name(pod_name)
+            if pod is None:
                 logging.warning(
                     "Could not find pod with given name, please choose from the available pods"
                 )
@@ -1,6 +1,8 @@
+import copy
 import json
 import os
 import pathlib
+import threading
 
 from aladdin.lib import logging, utils
 
@@ -36,18 +38,46 @@ def load_cluster_configs():
 def load_cluster_config(cluster):
     if _warn_missing_aladdin_config():
         return {}
-    return load_config_from_file(
-        f'{os.environ["ALADDIN_CONFIG_DIR"]}/{cluster}/config.json'
-    )
+    return load_config_from_file(_cluster_config_path(cluster))
 
 
 def load_namespace_override_config(cluster, namespace):
     if _warn_missing_aladdin_config():
         return {}
+    return load_config_from_file(_namespace_override_config_path(cluster, namespace))
+
+
+def cluster_config_revision(cluster, namespace):
+    """
+    Identify the revision of the config files that make up the rules of a cluster/namespace
+
+    Changes whenever one of the files is created, deleted or modified
+    """
+    config_dir = os.getenv("ALADDIN_CONFIG_DIR")
+    if not config_dir:
+        return (config_dir,)
+    revision = [config_dir]
+    for path in [
+        _cluster_config_path("default"),
+        _cluster_config_path(cluster),
+        _namespace_override_config_path(cluster, namespace),
+    ]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            revision.append(None)
+        else:
+            revision.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(revision)
+
+
+def _cluster_config_path(cluster):
+    return f'{os.environ["ALADDIN_CONFIG_DIR"]}/{cluster}/config.json'
+
+
+def _namespace_override_config_path(cluster, namespace):
     aladdin_config_dir = os.environ["ALADDIN_CONFIG_DIR"]
-    return load_config_from_file(
-        f"{aladdin_config_dir}/{cluster}/namespace-overrides/{namespace}/config.json"
-    )
+    return f"{aladdin_config_dir}/{cluster}/namespace-overrides/{namespace}/config.json"
 
 
 def load_publish_configs():
@@ -62,10 +92,108 @@ def load_git_configs():
     return load_config()["git"]
 
 
+class ReadOnlyDict(dict):
+    """
+    A dict that can't be modified, as handed out by the config store
+
+    Use dict(...) or copy.deepcopy(...) to get a mutable copy
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("aladdin config values are read-only, make a copy to modify them")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class ReadOnlyList(list):
+    """
+    A list that can't be modified, as handed out by the config store
+
+    Use list(...) or copy.deepcopy(...) to get a mutable copy
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("aladdin config values are read-only, make a copy to modify them")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = clear = extend = insert = pop = remove = reverse = sort = _readonly
+
+    def copy(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def read_only(value):
+    """Recursively convert dicts and lists to their read-only version"""
+    if isinstance(value, dict):
+        return ReadOnlyDict((key, read_only(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ReadOnlyList(read_only(item) for item in value)
+    return value
+
+
+class ConfigStore:
+    """
+    Process-wide store of the parsed config files
+
+    Each file is parsed once and only re-read if its mtime or size changed.
+    The parsed configs are shared by every caller so they are handed out as read-only views.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, file):
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached and cached[0] == signature:
+                self.hits += 1
+                return cached[1]
+
+        with open(path) as json_file:
+            json_data = read_only(json.load(json_file))
+        with self._lock:
+            self.misses += 1
+            self._files[path] = (signature, json_data)
+        return json_data
+
+    def invalidate(self, file=None):
+        with self._lock:
+            if file is None:
+                self._files.clear()
+            else:
+                self._files.pop(os.path.abspath(file), None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "files": len(self._files)}
+
+
+config_store = ConfigStore()
+
+
 def load_config_from_file(file):
-    with open(file) as json_file:
-        json_data = json.load(json_file)
-    return json_data
+    return config_store.load(file)
 
 
 def load_config():
@@ -94,6 +222,7 @@ def set_user_config_file(config: dict):
     pathlib.Path(path).mkdir(parents=True, exist_ok=True)
     with open(path / "config.json", "w") as json_file:
         json.dump(config, json_file, indent=2)
+    config_store.invalidate(path / "config.json")
 
 
 ALADDIN_DEV = utils.strtobool(os.getenv("ALADDIN_DEV", "false"))
@@ -2,9 +2,13 @@
 Module to configure environment variables used by Aladdin
 """
 
+import json
 import os
 import pathlib
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
 from pathlib import Path
 from typing import Optional
@@ -12,13 +16,36 @@ from typing import Optional
 from jmespath import search
 
 from aladdin import __version__, config
-from aladdin.lib import logging
+from aladdin.lib import config_checkout, logging
 from aladdin.lib.cluster_rules import ClusterRules
+from aladdin.lib.utils import strtobool
 
 logger = logging.getLogger(__name__)
 
+# Default number of seconds during which a fetched config/plugin repo is considered fresh,
+# can be changed with "aladdin config set repo_refresh_ttl SECONDS"
+DEFAULT_REPO_REFRESH_TTL = 600
+
+_user_config_lock = threading.Lock()
+
+ENV_SNAPSHOT_VERSION = 1
+# The environment variables set by configure_env
+ENV_SNAPSHOT_KEYS = [
+    "ALADDIN_MANAGE_SOFTWARE_DEPENDENCIES",
+    "ALADDIN_IMAGE",
+    "CLUSTER_CODE",
+    "IS_LOCAL",
+    "IS_PROD",
+    "IS_TESTING",
+    "LOCAL_CLUSTER_PROVIDER",
+    "HOST_DIR",
+]
+
 
 def configure_env():
+    if os.getenv("ALADDIN_CONTAINER") and load_env_snapshot():
+        return
+
     set_repo_path("ALADDIN_PLUGIN_DIR", "plugin_dir", "plugin_repo", required=False)
     user_config = {}
     with suppress(FileNotFoundError):
@@ -61,25 +88,130 @@ def configure_env():
         os.environ[key.upper()] = str(user_config.get(key, default_value))
 
 
+def env_snapshot_path(cluster: str, namespace: str) -> pathlib.Path:
+    """
+    Where the host saves the environment resolved by configure_env for the aladdin container
+
+    aladdin.sh gives the container path as ALADDIN_ENV_SNAPSHOT (~/.aladdin is mounted)
+    """
+    return pathlib.Path.home() / ".aladdin" / "cache" / f"env_snapshot_{cluster}_{namespace}.json"
+
+
+def _snapshot_checksum(snapshot: dict) -> str:
+    # hashlib loads openssl (a few MB), don't import it for the commands that don't need it
+    import hashlib
+
+    return hashlib.sha256(json.dumps(snapshot, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def write_env_snapshot():
+    """
+    Save the resolved environment and cluster rules so the aladdin container
+    doesn't have to resolve them again
+
+    Best effort: without a snapshot (e.g. the namespace isn't allowed on the cluster) the
+    container resolves the environment itself, and reports the errors
+    """
+    # aladdin.sh defaults the namespace of the container to "default"
+    namespace = os.getenv("NAMESPACE") or "default"
+    with suppress(KeyError, FileNotFoundError, ValueError, OSError):
+        snapshot = {
+            "version": ENV_SNAPSHOT_VERSION,
+            "aladdin_version": __version__,
+            "environment": {
+                key: os.environ[key] for key in ENV_SNAPSHOT_KEYS if key in os.environ
+            },
+            "cluster_rules": ClusterRules(namespace=namespace).snapshot(),
+        }
+        snapshot["checksum"] = _snapshot_checksum(snapshot)
+        path = env_snapshot_path(os.environ["CLUSTER_CODE"], namespace)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so the container never reads a partial snapshot
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(tmp_path, path)
+
+
+def load_env_snapshot() -> bool:
+    """
+    Configure the environment from the snapshot given by the host (ALADDIN_ENV_SNAPSHOT)
+
+    Returns False if there is no valid snapshot for the current cluster and namespace,
+    in which case the environment needs to be resolved again
+    """
+    path = os.getenv("ALADDIN_ENV_SNAPSHOT")
+    if not path:
+        return False
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return False
+
+    checksum = snapshot.pop("checksum", None)
+    cluster_rules = snapshot.get("cluster_rules", {})
+    if (
+        snapshot.get("version") != ENV_SNAPSHOT_VERSION
+        or snapshot.get("aladdin_version") != __version__
+        or checksum != _snapshot_checksum(snapshot)
+        # helm-values changes the cluster, and the namespace can be changed by -n
+        or snapshot["environment"].get("CLUSTER_CODE") != os.getenv("CLUSTER_CODE", "LOCAL")
+        or cluster_rules.get("namespace") != (os.getenv("NAMESPACE") or "default")
+    ):
+        logger.debug("Ignoring outdated environment snapshot %s", path)
+        return False
+
+    if not ClusterRules.seed(**cluster_rules):
+        logger.debug("Ignoring environment snapshot %s, the aladdin config changed", path)
+        return False
+    os.environ.update(snapshot["environment"])
+    return True
+
+
 def set_config_path() -> bool:
     """
     NOTE:
     If this function returns False it will short-circuit execution of
     any aladdin command, so returning False should be preceded by some
     user-friendly error statement about why we're exiting
+
+    The plugin repo is fetched at the same time as the config repo
     """
-    return set_repo_path(
-        "ALADDIN_CONFIG_DIR", "config_dir", "config_repo", required=True
-    )
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        plugin_path = executor.submit(
+            set_repo_path, "ALADDIN_PLUGIN_DIR", "plugin_dir", "plugin_repo", required=False
+        )
+        config_path = executor.submit(
+            set_repo_path,
+            "ALADDIN_CONFIG_DIR",
+            "config_dir",
+            "config_repo",
+            required=True,
+            sparse_clusters=[os.getenv("CLUSTER_CODE", "LOCAL")],
+        )
+        plugin_path.result()
+        return config_path.result()
 
 
 def set_repo_path(
-    env_key: str, dir_key: str, repo_key: str, required: bool = False
+    env_key: str,
+    dir_key: str,
+    repo_key: str,
+    required: bool = False,
+    sparse_clusters: Optional[list] = None,
 ) -> bool:
     """
     Function to set the "dir_key" env var
     Uses git to fetch the latest revision of the repo specified under "repo_key"
     The repo is expected to have a branch or tag that matches the current aladdin version
+
+    The repo is only fetched if it hasn't been in the last "repo_refresh_ttl" seconds
+    (or if --refresh-config was given). With "repo_background_refresh" enabled, a stale repo
+    is refreshed in the background and the current command uses the existing checkout.
+
+    sparse_clusters: the clusters to check out when the repo is a sparse checkout of the
+    aladdin config ("config_repo_sparse" user config, see lib/config_checkout)
     """
     if os.getenv(env_key):
         # env value is already set, nothing to do here
@@ -92,7 +224,7 @@ def set_repo_path(
         f"to set {repo_key} repo"
     )
     try:
-        user_config = config.load_user_config()
+        user_config = dict(config.load_user_config())
     except FileNotFoundError:
         logger.error(err_message)
         return False
@@ -131,13 +263,23 @@ def set_repo_path(
         repo_value = f"{git_account}/{repo}"
         if not repo_value.startswith("git@github.com:"):
             repo_value = f"git@github.com:{repo_value}"
-        user_config[repo_key] = repo_value
-        config.set_user_config_file(user_config)
+        with _user_config_lock:
+            # the config and plugin repos are set concurrently, re-read the
+            # user config so we don't override the other repo's changes
+            updated_config = dict(config.load_user_config())
+            updated_config[repo_key] = repo_value
+            config.set_user_config_file(updated_config)
 
     # The config repo is expected to have a branch or tag matching the current aladdin version
     git_commands = [f"git clone -b {__version__} {repo_value} {repo_key}"]
+    sparse = sparse_clusters is not None and strtobool(
+        str(user_config.get(config_checkout.SPARSE_CONFIG_KEY, "false"))
+    )
+    if sparse:
+        git_commands = [config_checkout.clone_command(repo_value, __version__, repo_key)]
     cwd = pathlib.Path.home() / ".aladdin"
     remote_config_path = cwd / repo_key
+    refresh = True
     if os.path.isdir(remote_config_path) and os.path.isdir(remote_config_path / ".git"):
         """
         The remote config has already been checked out,
@@ -145,7 +287,12 @@ def set_repo_path(
         """
         cwd = remote_config_path
         git_commands = ["git fetch --tags --prune -f", f"git checkout {__version__}"]
-    for command in git_commands:
+        refresh = _repo_needs_refresh(repo_key, user_config)
+        if refresh and _background_refresh_enabled(user_config):
+            _refresh_repo_in_background(repo_key, cwd, git_commands)
+            refresh = False
+
+    for command in git_commands if refresh else []:
         try:
             subprocess.run(
                 command.split(),
@@ -162,6 +309,20 @@ def set_repo_path(
                 e.stderr.strip() or e.stdout.strip(),
             )
             return False
+    if refresh:
+        _record_repo_refresh(repo_key)
+
+    if sparse_clusters is not None:
+        try:
+            if sparse:
+                config_checkout.update(remote_config_path, sparse_clusters)
+            else:
+                config_checkout.disable(remote_config_path)
+        except subprocess.CalledProcessError as e:
+            logger.error(
+                "Failed to update the checkout of aladdin %s: \n%s", repo_key, e.stderr.strip()
+            )
+            return False
 
     os.environ[env_key] = str(remote_config_path)
 
@@ -172,3 +333,61 @@ def set_repo_path(
         os.environ[env_key] = dir_value
 
     return True
+
+
+def _repo_refresh_path(repo_key: str) -> pathlib.Path:
+    return pathlib.Path.home() / ".aladdin" / f"{repo_key}_last_refresh.json"
+
+
+def _repo_needs_refresh(repo_key: str, user_config: dict) -> bool:
+    if strtobool(os.getenv("REFRESH_CONFIG", "false")):
+        return True
+    try:
+        with open(_repo_refresh_path(repo_key)) as refresh_file:
+            last_refresh = json.load(refresh_file)
+        version = last_refresh.get("version")
+        age = time.time() - float(last_refresh.get("time", 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        # missing or invalid refresh file
+        return True
+    if version != __version__:
+        # a new aladdin version needs a new branch/tag of the repo
+        return True
+    try:
+        ttl = int(user_config.get("repo_refresh_ttl", DEFAULT_REPO_REFRESH_TTL))
+    except (ValueError, TypeError):
+        logger.warning("Invalid repo_refresh_ttl in your aladdin config, using the default")
+        ttl = DEFAULT_REPO_REFRESH_TTL
+    # a negative age means the clock went back, don't trust the timestamp
+    return age < 0 or age > ttl
+
+
+def _background_refresh_enabled(user_config: dict) -> bool:
+    if strtobool(os.getenv("REFRESH_CONFIG", "false")):
+        return False
+    return strtobool(str(user_config.get("repo_background_refresh", "false")))
+
+
+def _record_repo_refresh(repo_key: str):
+    with suppress(OSError):
+        with open(_repo_refresh_path(repo_key), "w") as refresh_file:
+            json.dump({"version": __version__, "time": time.time()}, refresh_file)
+
+
+def _refresh_repo_in_background(repo_key: str, cwd: pathlib.Path, git_commands: list):
+    """
+    Refresh the repo in a detached process so the current command is never blocked
+
+    The refresh is recorded right away so that the following commands
+    don't start their own background refresh
+    """
+    logger.debug("Refreshing aladdin %s in the background", repo_key)
+    _record_repo_refresh(repo_key)
+    subprocess.Popen(
+        ["sh", "-c", " && ".join(git_commands)],
+        cwd=str(cwd),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
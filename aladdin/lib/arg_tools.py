@@ -1,15 +1,16 @@
 import argparse
 import functools
-import json
 import os
 import sys
 from contextlib import suppress
 from inspect import signature
 
-import pkg_resources
-from kubernetes import config as kube_config
+import lazy_object_proxy
 
 from aladdin.config import PROJECT_ROOT
+from aladdin.lib import tracing
+from aladdin.lib.k8s import kubeconfig
+from aladdin.lib.manifest import load_manifest
 
 
 def get_current_namespace():
@@ -19,8 +20,8 @@ def get_current_namespace():
         namespace = os.getenv("NAMESPACE")
 
     if not namespace:
-        with suppress(KeyError, kube_config.config_exception.ConfigException):
-            _, active_context = kube_config.list_kube_config_contexts()
+        with suppress(KeyError, TypeError, kubeconfig.KubeconfigError):
+            _, active_context = kubeconfig.list_contexts()
             namespace = active_context["context"]["namespace"]
 
     if not namespace:
@@ -29,52 +30,97 @@ def get_current_namespace():
 
 
 def add_namespace_argument(arg_parser):
-    _current_namespace = get_current_namespace()
+    # The current namespace is only resolved if the parser actually needs the default value
+    # (or when printing the help), not when the argument is added
     arg_parser.add_argument(
         "--namespace",
         "-n",
-        default=_current_namespace,
+        default=lazy_object_proxy.Proxy(get_current_namespace),
+        type=str,
         dest="namespace",
         action=EnvStoreAction,
-        help=f"namespace name, defaults to current: [{_current_namespace}]",
+        help="namespace name, defaults to current: [%(default)s]",
+    )
+
+
+def add_deploy_pool_arguments(arg_parser):
+    arg_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=4,
+        help="number of projects to deploy at the same time, defaults to %(default)s",
+    )
+    arg_parser.add_argument(
+        "--continue-on-error",
+        action="store_true",
+        help="keep deploying the other projects when a project fails to deploy",
     )
 
 
 def bash_wrapper():
+    # exec doesn't run the exit handlers, write the trace of what ran so far
+    tracing.finish()
+    if not os.getenv("ALADDIN_CONTAINER"):
+        # aladdin.sh is about to start the container, give it the resolved environment
+        from aladdin.env import write_env_snapshot
+
+        write_env_snapshot()
     _, *args = sys.argv
     handler = PROJECT_ROOT / "aladdin.sh"
     os.environ["PYTHONPATH"] = ":".join(sys.path)
     os.execv(str(handler), ["aladdin.sh", *args])
 
 
-def container_command(func=None):
+def container_command(func=None, native=False):
     """
     Decorator to wrap aladdin commands that
     need to be run inside the aladdin container
+
+    native: True (or a function of the command's arguments returning True) if the
+    command can also run directly on the host when the host toolchain is compatible,
+    see lib/host_toolchain.py
     """
 
-    @functools.wraps(func)
-    def _wrapper(*args, **kwargs):
-        # using `ALADDIN_CONTAINER` as way to know if we're "in" the aladdin container
-        if not os.getenv("ALADDIN_CONTAINER"):
-            return bash_wrapper()
-        return func(*args, **kwargs)
+    def decorator(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            # using `ALADDIN_CONTAINER` as way to know if we're "in" the aladdin container
+            if not os.getenv("ALADDIN_CONTAINER") and not _run_natively(native, args, kwargs):
+                return bash_wrapper()
+            return func(*args, **kwargs)
+
+        return _wrapper
 
     if not func:
-        return container_command
-    return _wrapper
+        return decorator
+    return decorator(func)
+
+
+def _run_natively(native, args, kwargs):
+    if callable(native):
+        native = native(*args, **kwargs)
+    if not native:
+        return False
+
+    from aladdin.lib.host_toolchain import configure_native_env
+
+    return configure_native_env()
 
 
 def get_bash_commands():
+    """
+    Return a list of tuples going from command name to parse args function
+    for the commands that are handled by the bash portion of aladdin (bash commands and plugins)
+    """
     commands = []
-    bash_cmd_helps = json.loads(
-        pkg_resources.resource_string("aladdin", "bash_help.json").decode("utf-8")
-    )
+    for bash_cmd, entry in load_manifest()["commands"].items():
+        if entry.get("container", {}).get("kind") == "python":
+            continue
 
-    for bash_cmd, bash_help in bash_cmd_helps.items():
         # Use default values for bash_cmd and bash_help so they are evaluated at definition time
         # rather than invocation time
-        def add_command(parser, cmd=bash_cmd, help_msg=bash_help["help"]):
+        def add_command(parser, cmd=bash_cmd, help_msg=entry["help"]):
             sub_parser = parser.add_parser(cmd, help=help_msg)
             sub_parser.set_defaults(func=lambda args: bash_wrapper())
 
@@ -92,7 +138,10 @@ HELM_OPTION_PARSER.add_argument(
 HELM_OPTION_PARSER.add_argument(
     "--force-helm",
     action="store_true",
-    help="Have helm force resource update through delete/recreate if needed",
+    help=(
+        "Have helm force resource update through delete/recreate if needed, and upgrade "
+        "the release even if its chart and values didn't change"
+    ),
 )
 HELM_OPTION_PARSER.add_argument(
     "--set-override-values",
@@ -1,13 +1,17 @@
 import datetime
+import hashlib
+import json
 import logging
+import os
 import pathlib
 import time
 import functools
-import shelve
 import shutil
-from contextlib import contextmanager, closing
+import threading
+from contextlib import contextmanager, suppress
 from collections import defaultdict
 
+from aladdin import config
 from aladdin.lib.cluster_rules import ClusterRules
 
 cache_root = pathlib.Path.home() / ".aladdin" / "cache"
@@ -23,9 +27,36 @@ def clear_on_error():
         raise
 
 
+def _entry_path(cache_path: pathlib.Path, key: str) -> pathlib.Path:
+    return cache_path / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+
+def _read_entry(entry: pathlib.Path) -> dict:
+    """The content of a cache entry, {} if it is missing or unreadable"""
+    with suppress(OSError, ValueError):
+        data = json.loads(entry.read_text())
+        if isinstance(data, dict):
+            return data
+    return {}
+
+
+def _write_entry(entry: pathlib.Path, data: dict):
+    """Replace a cache entry atomically, other processes may be reading or writing it"""
+    with suppress(OSError):
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_entry = entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_entry.write_text(json.dumps(data))
+        os.replace(tmp_entry, entry)
+
+
 def certificate_cache(func):
-    cache_root.mkdir(parents=True, exist_ok=True)
-    cache_path = cache_root / "certificates"
+    """
+    Cache the certificate found for a scope, see get_certificate_arn
+
+    Deploys run in parallel processes, each certificate scope has its own json file like in
+    git_refs_cache
+    """
+    cache_path = cache_root / "certificates.d"
     ttls = defaultdict(
         # the default ttl for existing certificates
         lambda: datetime.timedelta(hours=1),
@@ -37,31 +68,130 @@ def certificate_cache(func):
     )
 
     @functools.wraps(func)
-    @clear_on_error()
     def wrapper(certificate_scope):
         if not ClusterRules().certificate_lookup_cache:
             return func(certificate_scope)
 
-        with closing(shelve.open(str(cache_path))) as cache:
-            data: dict = cache.get(certificate_scope) or {}
-
-            age = time.time() - data.get("time", 0)
-            value = data.get("value")
-            ttl = ttls[value]
-            if (
-                not data
-                or age > ttl.total_seconds()
-            ):
-                value = func(certificate_scope)
-                cache[certificate_scope] = {
-                    "value": value,
-                    "time": time.time(),
-                }
-            elif value:
-                logging.info(
-                    "Found CACHED certificate %s for %s",
-                    value, certificate_scope
-                )
-            return value
+        entry = _entry_path(cache_path, certificate_scope)
+        data = _read_entry(entry)
+        if data.get("scope") != certificate_scope:
+            data = {}
+
+        age = time.time() - data.get("time", 0)
+        value = data.get("value")
+        ttl = ttls[value]
+        if (
+            not data
+            or age > ttl.total_seconds()
+        ):
+            value = func(certificate_scope)
+            _write_entry(
+                entry, {"scope": certificate_scope, "value": value, "time": time.time()}
+            )
+        elif value:
+            logging.info(
+                "Found CACHED certificate %s for %s",
+                value, certificate_scope
+            )
+        return value
 
     return wrapper
+
+
+def git_refs_cache(func):
+    """
+    Cache the refs of a git remote for a short time, see Git.ls_remote
+
+    Pass refresh=True to the wrapped function to bypass the cache
+
+    The refs are fetched concurrently by threads (see Git.prefetch_refs) and by processes
+    (e.g. one helm-values per chart during parallel deploys), so each remote has its own
+    json file, replaced atomically, rather than a shelve that only one process can write
+    """
+    cache_path = cache_root / "git_refs.d"
+    ttl = datetime.timedelta(minutes=1)
+
+    @functools.wraps(func)
+    def wrapper(cls, url, refresh=False):
+        entry = _entry_path(cache_path, url)
+        data = _read_entry(entry)
+
+        age = time.time() - data.get("time", 0)
+        if data.get("url") == url and not refresh and age <= ttl.total_seconds():
+            return [tuple(ref) for ref in data["value"]]
+
+        value = func(cls, url)
+        if value is not None:
+            _write_entry(entry, {"url": url, "value": value, "time": time.time()})
+        return value
+
+    return wrapper
+
+
+class HelmValuesCache:
+    """
+    On disk cache of the values computed by helm-values, one file per key digest
+
+    The key must identify everything the values are computed from. The least recently
+    used entries are removed when the cache grows over "helm_values_cache_max_size" MB
+    (user config, 100MB by default).
+    """
+
+    DEFAULT_MAX_SIZE_MB = 100
+
+    def __init__(self, path: pathlib.Path = cache_root / "helm_values"):
+        self.path = path
+
+    @staticmethod
+    def digest(key: dict) -> str:
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: dict):
+        entry = self.path / f"{self.digest(key)}.yaml"
+        try:
+            content = entry.read_text()
+        except OSError:
+            return None
+        # the mtime is used for the LRU eviction
+        with suppress(OSError):
+            entry.touch()
+        return content
+
+    def put(self, key: dict, content: str):
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = self.path / f"{self.digest(key)}.yaml"
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        tmp_entry.write_text(content)
+        os.replace(tmp_entry, entry)
+        self.evict()
+
+    def evict(self, max_size_mb: int = None):
+        if max_size_mb is None:
+            max_size_mb = self._max_size_mb()
+        entries = []
+        for entry in self.path.glob("*.yaml"):
+            with suppress(OSError):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= max_size_mb * 1024 * 1024:
+                break
+            with suppress(OSError):
+                entry.unlink()
+            total -= size
+
+    def purge(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @classmethod
+    def _max_size_mb(cls) -> int:
+        try:
+            # not load_user_config, which creates the user config if it is missing
+            user_config = config.load_config_from_file(
+                pathlib.Path.home() / ".aladdin/config/config.json"
+            )
+            return int(user_config.get("helm_values_cache_max_size", cls.DEFAULT_MAX_SIZE_MB))
+        except (FileNotFoundError, ValueError):
+            return cls.DEFAULT_MAX_SIZE_MB
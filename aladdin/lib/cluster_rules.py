@@ -1,25 +1,91 @@
+import functools
 import os
+import threading
 from typing import List
 
-import boto3
-
 try:
     from functools import cached_property
 except ImportError:
     # Running on pre-3.8 Python; use backport
     from backports.cached_property import cached_property
 
-from aladdin.config import load_cluster_config, load_namespace_override_config
+from aladdin.config import (
+    cluster_config_revision,
+    load_cluster_config,
+    load_namespace_override_config,
+    read_only,
+)
+from aladdin.lib import tracing
 from aladdin.lib.arg_tools import get_current_namespace
 from aladdin.lib.utils import strtobool
 
 
 class ClusterRules:
-    def __init__(self, cluster=None, namespace=None):
-        self.rules = _cluster_rules(cluster=cluster, namespace=namespace)
-        self._namespace = namespace or get_current_namespace()
+    """
+    The rules of a cluster/namespace, as defined by the aladdin config
+
+    The resolved rules are cached per (cluster, namespace, config files revision) so
+    constructing ClusterRules() repeatedly returns the same object (and boto session)
+    """
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __new__(cls, cluster=None, namespace=None):
+        namespace = namespace or get_current_namespace()
+        if cluster is None:
+            cluster = os.environ["CLUSTER_CODE"]
+        key = (cluster, namespace, cluster_config_revision(cluster, namespace))
+        with cls._lock:
+            instance = cls._instances.get(key)
+        if instance is None:
+            instance = cls._create(
+                key, _cluster_rules(cluster=cluster, namespace=namespace)
+            )
+        return instance
+
+    @classmethod
+    def _create(cls, key, rules):
+        instance = super().__new__(cls)
+        instance.rules = rules
+        instance._cluster, instance._namespace, instance._revision = key
+        with cls._lock:
+            return cls._instances.setdefault(key, instance)
+
+    @classmethod
+    def seed(cls, cluster, namespace, revision, rules) -> bool:
+        """
+        Cache rules that were resolved by another process (see env.py's environment snapshot)
+
+        The rules are ignored if the config files changed since they were resolved,
+        the revision is compared without the config dir since it is mounted elsewhere
+        in the aladdin container. Returns whether the rules were cached.
+        """
+        current_revision = cluster_config_revision(cluster, namespace)
+        if list(map(_as_list, current_revision[1:])) != list(map(_as_list, revision[1:])):
+            return False
+        cls._create((cluster, namespace, current_revision), read_only(rules))
+        return True
+
+    def snapshot(self) -> dict:
+        """The resolved rules in a json serializable form, to be given to ClusterRules.seed"""
+        return {
+            "cluster": self._cluster,
+            "namespace": self._namespace,
+            "revision": self._revision,
+            "rules": self.rules,
+        }
+
+    @classmethod
+    def invalidate(cls):
+        """Forget the resolved rules, the next ClusterRules() will read the config files again"""
+        with cls._lock:
+            cls._instances.clear()
 
     def __getattr__(self, attr):
+        if attr in ["rules", "_cluster", "_namespace", "_revision"]:
+            # Don't recurse into __getattr__ if the instance is not fully created yet
+            raise AttributeError(attr)
         if attr in self.rules:
             return self.rules.get(attr)
         raise AttributeError(
@@ -136,7 +202,20 @@ class ClusterRules:
 
     @cached_property
     def boto(self):
-        return boto3.Session(profile_name=self.aws_profile)
+        return _boto_session(self.aws_profile)
+
+
+@functools.lru_cache(maxsize=None)
+def _boto_session(profile_name):
+    # boto3 is slow to import, only import it when a session is needed
+    import boto3
+
+    return tracing.trace_boto_session(boto3.Session(profile_name=profile_name))
+
+
+def _as_list(value):
+    # revisions go through json, which turns tuples into lists
+    return list(value) if isinstance(value, (tuple, list)) else value
 
 
 def _cluster_rules(cluster=None, namespace=None) -> dict:
@@ -180,7 +259,7 @@ def _cluster_rules(cluster=None, namespace=None) -> dict:
 
 def _update_rules(rules, override):
     # Update values separately and save it in values variable since it's an inner dictionary
-    values = rules.get("values", {})
+    values = dict(rules.get("values", {}))
     values.update(override.get("values", {}))
 
     rules.update(override)
@@ -0,0 +1,143 @@
+"""
+Static table of aladdin's python commands
+
+The argparse tree is built from this table so that running aladdin doesn't import every
+command module (and their dependencies: kubernetes, boto3, jinja2, networkx...).
+Only the module of the command that was actually selected gets imported.
+"""
+import importlib
+from collections import namedtuple
+
+PythonCommand = namedtuple("PythonCommand", ["name", "help", "module"])
+
+# NOTE: keep the help text in sync with the "parse_args" function of each command module
+PYTHON_COMMANDS = [
+    PythonCommand(
+        "build",
+        "Build a project's docker images for local development",
+        "aladdin.commands.build",
+    ),
+    PythonCommand(
+        "build-components",
+        'The default aladdin build script to be run when "aladdin build" is invoked.',
+        "aladdin.commands.build_components",
+    ),
+    PythonCommand(
+        "cluster-init",
+        "Install all projects as defined by cluster_init in"
+        " your cluster's config if not already installed",
+        "aladdin.commands.cluster_init",
+    ),
+    PythonCommand(
+        "cmd",
+        "Run commands on specifc project via its commands pod",
+        "aladdin.commands.cmd",
+    ),
+    PythonCommand(
+        "connect",
+        "Connect to a container",
+        "aladdin.commands.connect",
+    ),
+    PythonCommand(
+        "deploy",
+        "Start the helm chart in non local environments",
+        "aladdin.commands.deploy",
+    ),
+    PythonCommand(
+        "environment",
+        "Manipulate configMap/environments of projects",
+        "aladdin.commands.environment",
+    ),
+    PythonCommand(
+        "get-certificate",
+        "Get the certificate arn needed for the services elb",
+        "aladdin.commands.get_certificate",
+    ),
+    PythonCommand(
+        "helm-values",
+        "Given a git ref, compute helm values for the given cluster, repo, and chart",
+        "aladdin.commands.helm_values",
+    ),
+    PythonCommand(
+        "namespace-init",
+        "Install all projects as defined by namespace_init in"
+        " your cluster's config if not already installed",
+        "aladdin.commands.namespace_init",
+    ),
+    PythonCommand(
+        "publish",
+        "Build the docker and helm package and publish to ecr and S3",
+        "aladdin.commands.publish",
+    ),
+    PythonCommand(
+        "refresh",
+        "Delete pods which match app to reload them",
+        "aladdin.commands.refresh",
+    ),
+    PythonCommand(
+        "restart",
+        "Remove everything before deploying again",
+        "aladdin.commands.restart",
+    ),
+    PythonCommand(
+        "rollback",
+        "Go back to a previous deployment",
+        "aladdin.commands.rollback",
+    ),
+    PythonCommand(
+        "scale",
+        "Scale a deployment to n replicas",
+        "aladdin.commands.scale",
+    ),
+    PythonCommand(
+        "start",
+        "Start the helm chart in local",
+        "aladdin.commands.start",
+    ),
+    PythonCommand(
+        "stop",
+        "Remove the helm chart in local",
+        "aladdin.commands.stop",
+    ),
+    PythonCommand(
+        "sync-ingress",
+        "Synchronize ingress to put services behind ingress",
+        "aladdin.commands.sync_ingress",
+    ),
+    PythonCommand(
+        "tail",
+        "Tail logs of multiple pods",
+        "aladdin.commands.tail",
+    ),
+    PythonCommand(
+        "undeploy",
+        "Remove the helm chart in non local environments",
+        "aladdin.commands.undeploy",
+    ),
+    PythonCommand(
+        "version",
+        "Show aladdin version",
+        "aladdin.commands.version",
+    ),
+]
+
+
+def get_python_commands(selected=None):
+    """
+    Return a list of tuples going from command name to parse args function
+
+    Only the "selected" command gets its module imported and its real sub parser added,
+    every other command gets a placeholder sub parser that only carries its help text.
+    """
+    commands = []
+    for command in PYTHON_COMMANDS:
+        if command.name == selected:
+            add_command = importlib.import_module(command.module).parse_args
+        else:
+            # Use default values so they are evaluated at definition time
+            # rather than invocation time
+            def add_command(parser, cmd=command.name, help_msg=command.help):
+                parser.add_parser(cmd, help=help_msg)
+
+        commands.append((command.name, add_command))
+    return commands
@@ -0,0 +1,91 @@
+"""
+Sparse checkout of the aladdin config repo
+
+With "aladdin config set config_repo_sparse true", the config repo is cloned without
+blobs and only the top-level files, default/ and the directories of the clusters in use are
+checked out. Cluster backups and the configs of unused clusters are never downloaded.
+
+The sparse set grows on demand: when aladdin runs on the host for a cluster that isn't
+checked out yet (see env.set_repo_path), its directory is added to the checkout. This is only
+done on the host, in the container the config repo is a bind mount that git may refuse to
+touch ("dubious ownership"). If the directory can't be added, the whole repo is checked out.
+"""
+import os
+import subprocess
+
+from aladdin.lib import logging
+from aladdin.lib.repo_state import RepoState
+
+logger = logging.getLogger(__name__)
+
+SPARSE_CONFIG_KEY = "config_repo_sparse"
+ALWAYS_INCLUDED = ["default"]
+
+
+def clone_command(repo_url: str, branch: str, dest: str) -> str:
+    """Clone the repo without blobs and with only its top-level files checked out"""
+    return f"git clone --filter=blob:none --sparse -b {branch} {repo_url} {dest}"
+
+
+def is_sparse(repo_path) -> bool:
+    state = RepoState.current(repo_path)
+    if state is None or state.toplevel != os.path.realpath(repo_path):
+        return False
+    return state.config.get(("core", None, "sparsecheckout"), "false").lower() == "true"
+
+
+def _existing_directories(repo_path, names) -> set:
+    """The names that are top-level directories of the checked out commit"""
+    output = subprocess.run(
+        ["git", "ls-tree", "-d", "--name-only", "HEAD", "--", *names],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+        encoding="utf-8",
+    ).stdout
+    return set(output.split())
+
+
+def update(repo_path, clusters: list):
+    """
+    Make repo_path a sparse checkout of its top-level files, default/ and the clusters'
+    directories, only adding to the sparse set if it already is one
+    """
+    wanted = [*ALWAYS_INCLUDED, *clusters]
+    sparse = is_sparse(repo_path)
+    if sparse and all(os.path.isdir(os.path.join(repo_path, name)) for name in wanted):
+        return
+    directories = sorted(_existing_directories(repo_path, wanted))
+    if sparse:
+        command = ["git", "sparse-checkout", "add", *directories]
+    else:
+        logger.info("Switching to a sparse checkout of the aladdin config")
+        command = ["git", "sparse-checkout", "set", "--cone", *directories]
+    try:
+        subprocess.run(command, cwd=repo_path, check=True, capture_output=True, encoding="utf-8")
+    except subprocess.CalledProcessError as e:
+        logger.warning(
+            "Could not add %s to the aladdin config checkout, checking out the whole repo: %s",
+            ", ".join(directories),
+            e.stderr.strip(),
+        )
+        _disable(repo_path)
+    RepoState.invalidate()
+
+
+def disable(repo_path):
+    """Check out the whole repo again if it was a sparse checkout"""
+    if is_sparse(repo_path):
+        logger.info("Checking out the whole aladdin config")
+        _disable(repo_path)
+        RepoState.invalidate()
+
+
+def _disable(repo_path):
+    subprocess.run(
+        ["git", "sparse-checkout", "disable"],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+        encoding="utf-8",
+    )
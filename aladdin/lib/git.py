@@ -1,10 +1,18 @@
+import json
 import logging
 import os
 import subprocess
 import tempfile
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager, suppress, nullcontext
 
+import yaml
+
+from aladdin.lib import git_cache, tracing
+from aladdin.lib.cache import git_refs_cache
+from aladdin.lib.repo_state import RepoState
 from aladdin.lib.utils import working_directory
 from aladdin.config import load_git_configs, ALADDIN_DEV
 
@@ -13,22 +21,125 @@ class Git:
     SHORT_HASH_SIZE = 10
 
     @classmethod
-    def clone(cls, git_repo, dest_path):
-        subprocess.check_call(["git", "clone", git_repo, dest_path])
+    def clone(cls, git_repo, dest_path, partial=False):
+        if partial:
+            # only download the blobs that get checked out
+            subprocess.check_call(
+                ["git", "clone", "--filter=blob:none", "--no-checkout", git_repo, dest_path]
+            )
+        else:
+            subprocess.check_call(["git", "clone", git_repo, dest_path])
+
+    SUBMODULE_JOBS = 8
 
     @classmethod
-    def init_submodules(cls, git_path):
-        with working_directory(git_path):
-            subprocess.check_call(["git", "submodule", "update", "--init", "--recursive"])
+    def init_submodules(cls, git_path, jobs=SUBMODULE_JOBS):
+        """
+        Recursively initialize the submodules of git_path, up to "jobs" submodules at a time
+
+        Submodules are cloned from the local git cache (see git_cache), so a submodule
+        commit that was already fetched doesn't need any network transfer
+        """
+        # registers the submodule urls (resolving relative ones) in .git/config
+        subprocess.check_call(["git", "submodule", "init"], cwd=git_path)
+        submodules = _list_submodules(git_path)
+        if not submodules:
+            return
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=min(jobs, len(submodules))) as executor:
+            futures = [
+                executor.submit(cls._init_submodule, git_path, jobs, *submodule)
+                for submodule in submodules
+            ]
+            for future in futures:
+                future.result()
+        logging.info(
+            "Initialized %d submodules of %s in %.1fs",
+            len(submodules),
+            git_path,
+            time.time() - start,
+        )
+
+    @classmethod
+    def _init_submodule(cls, git_path, jobs, name, path, url, githash):
+        start = time.time()
+        update = ["git", "submodule", "update", "--", path]
+        source = "cache"
+        with git_cache.local_mirror(url, githash) as mirror:
+            if mirror:
+                try:
+                    # clone from the mirror instead of the url (local clones are only
+                    # allowed for submodules if the file protocol is)
+                    subprocess.run(
+                        [
+                            "git", "-c", f"submodule.{name}.url={mirror}",
+                            "-c", "protocol.file.allow=always", *update[1:],
+                        ],
+                        cwd=git_path,
+                        check=True,
+                        capture_output=True,
+                    )
+                    subprocess.check_call(
+                        ["git", "remote", "set-url", "origin", url],
+                        cwd=os.path.join(git_path, path),
+                    )
+                except subprocess.CalledProcessError as e:
+                    logging.warning(
+                        "Could not clone submodule %s from the git cache: %s", path, e.stderr
+                    )
+                    mirror = None
+            if not mirror:
+                source = "remote"
+                subprocess.check_call(update, cwd=git_path)
+        logging.info("Initialized submodule %s from %s in %.1fs", path, source, time.time() - start)
+
+        submodule_path = os.path.join(git_path, path)
+        if os.path.exists(os.path.join(submodule_path, ".gitmodules")):
+            # nested submodules get their own pool, the parent pool's workers are all busy
+            cls.init_submodules(submodule_path, jobs)
 
     @classmethod
     def checkout(cls, git_path, ref):
         with working_directory(git_path):
             subprocess.check_call(["git", "checkout", ref])
+        RepoState.invalidate()
+
+    @classmethod
+    def sparse_checkout(cls, git_path, ref):
+        """
+        Only check out lamp.json and the helm charts it declares (with their local dependencies)
+
+        That's all deploy and helm-values need, falls back to a full checkout if the
+        charts can't be found or git doesn't support sparse checkouts
+        """
+        RepoState.invalidate()
+        with working_directory(git_path):
+            try:
+                subprocess.run(
+                    ["git", "sparse-checkout", "set", "--no-cone", "/lamp.json"],
+                    check=True,
+                    capture_output=True,
+                )
+                subprocess.check_call(["git", "checkout", "--quiet", ref])
+                if _sparse_checkout_charts(git_path):
+                    return
+            except subprocess.CalledProcessError:
+                pass
+            logging.info("Could not find the charts to check out, checking out everything")
+            with suppress(subprocess.CalledProcessError):
+                subprocess.run(
+                    ["git", "sparse-checkout", "disable"], check=True, capture_output=True
+                )
+            subprocess.check_call(["git", "checkout", ref])
 
     @classmethod
     def get_repo_name(cls):
-        origin = subprocess.check_output(["git", "remote", "get-url", "origin"], encoding="utf-8").strip()
+        state = RepoState.current()
+        origin = state and state.origin_url
+        if not origin:
+            origin = subprocess.check_output(
+                ["git", "remote", "get-url", "origin"], encoding="utf-8"
+            ).strip()
         slug = os.path.basename(origin)
         return slug[:-4] if slug.endswith(".git") else slug
 
@@ -38,12 +149,21 @@ class Git:
 
     @classmethod
     def get_full_hash(cls):
+        state = RepoState.current()
+        if state and state.head:
+            return state.head
         return subprocess.check_output(["git", "rev-parse", "HEAD"], encoding="utf-8").rstrip()
 
     @classmethod
     def clean_working_tree(cls):
+        """Whether the tracked files match HEAD (staged changes make the tree dirty too)"""
+        state = RepoState.current()
         try:
-            subprocess.check_output(["git", "diff", "--exit-code", "--quiet"], encoding="utf-8")
+            if state:
+                return state.clean
+            subprocess.check_output(
+                ["git", "diff", "HEAD", "--exit-code", "--quiet"], encoding="utf-8"
+            )
         except subprocess.CalledProcessError:
             return False
         else:
@@ -51,6 +171,9 @@ class Git:
 
     @classmethod
     def get_base_directory(cls):
+        state = RepoState.current()
+        if state:
+            return state.toplevel
         return subprocess.check_output(["git", "rev-parse", "--show-toplevel"], encoding="utf-8").strip()
 
     @classmethod
@@ -81,22 +204,134 @@ class Git:
         :param ref:
         :param url:
         """
+        refs = cls.ls_remote(url)
+        if refs is None:
+            return None
+        githash = cls._resolve_ref(ref, refs)
+        if githash is None:
+            # the ref might have been pushed since the refs were cached
+            githash = cls._resolve_ref(ref, cls.ls_remote(url, refresh=True) or [])
+        return githash
+
+    @classmethod
+    @git_refs_cache
+    def ls_remote(cls, url):
+        """
+        List the (hash, ref name) of the branches, tags and HEAD of the remote
+
+        The refs are fetched with a single "git ls-remote" and cached for a short time
+        """
         try:
-            output = (
-                subprocess.check_output(
-                    ["git", "ls-remote", url, ref],
-                    stderr=subprocess.DEVNULL,
-                    encoding="utf-8",
-                )
-                .split()
+            output = subprocess.check_output(
+                ["git", "ls-remote", url, "HEAD", "refs/heads/*", "refs/tags/*"],
+                stderr=subprocess.DEVNULL,
+                encoding="utf-8",
             )
-            return output[0] if output else None
         except subprocess.CalledProcessError:
             return None
+        return [tuple(line.split()) for line in output.splitlines() if line.strip()]
+
+    @classmethod
+    def _resolve_ref(cls, ref, refs):
+        """
+        Find the hash of ref in the output of ls_remote
+
+        Refs are matched like "git ls-remote URL REF" does (i.e. "main" matches
+        "refs/heads/main"), otherwise ref is looked up as a (short) hash of one of the refs
+        """
+        for githash, name in refs:
+            if name == ref or name.endswith(f"/{ref}"):
+                return githash
+        if len(ref) >= 4 and all(c in "0123456789abcdef" for c in ref.lower()):
+            matches = {githash for githash, _ in refs if githash.startswith(ref.lower())}
+            if len(matches) == 1:
+                return matches.pop()
+        return None
+
+    @classmethod
+    def prefetch_refs(cls, urls):
+        """Fetch the refs of several remotes concurrently so the following lookups hit the cache"""
+        urls = set(urls)
+        if not urls:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(urls), 8)) as executor:
+            list(executor.map(cls.ls_remote, urls))
+
+    @classmethod
+    def get_url(cls, repo_name):
+        git_account = load_git_configs()["account"]
+        return f"git@github.com:{git_account}/{repo_name}.git"
+
+
+def _list_submodules(git_path):
+    """The (name, path, url, commit) of the initialized submodules of git_path"""
+    try:
+        paths = subprocess.check_output(
+            ["git", "config", "-f", ".gitmodules", "--get-regexp", r"^submodule\..*\.path$"],
+            cwd=git_path,
+            encoding="utf-8",
+        )
+    except subprocess.CalledProcessError:
+        # no .gitmodules or no submodules in it
+        return []
+    submodules = []
+    for line in paths.splitlines():
+        key, _, path = line.partition(" ")
+        name = key[len("submodule."):-len(".path")]
+        with suppress(subprocess.CalledProcessError):
+            url = subprocess.check_output(
+                ["git", "config", "--get", f"submodule.{name}.url"], cwd=git_path, encoding="utf-8"
+            ).strip()
+            # gitlinks are staged with mode 160000: "<mode> <hash> <stage>\t<path>"
+            staged = subprocess.check_output(
+                ["git", "ls-files", "-s", "--", path], cwd=git_path, encoding="utf-8"
+            )
+            if staged.startswith("160000 "):
+                submodules.append((name, path, url, staged.split()[1]))
+    return submodules
+
+
+def _sparse_checkout_charts(git_path):
+    """
+    Add the helm charts listed in lamp.json and their local (file://) dependencies
+    to the sparse checkout, returns False if lamp.json doesn't list any chart
+    """
+    try:
+        with open(os.path.join(git_path, "lamp.json")) as lamp_file:
+            charts = json.load(lamp_file).get("helm_chart")
+    except (OSError, ValueError):
+        return False
+    if not charts:
+        return False
+    charts = [charts] if isinstance(charts, str) else list(charts)
+
+    paths = set()
+    while charts:
+        chart = os.path.normpath(charts.pop())
+        if chart.startswith("..") or chart in paths:
+            continue
+        paths.add(chart)
+        # the chart needs to be checked out to find its dependencies
+        subprocess.check_call(["git", "sparse-checkout", "add", f"/{chart}/"], cwd=git_path)
+        for manifest in ["Chart.yaml", "requirements.yaml"]:
+            with suppress(OSError, yaml.YAMLError, AttributeError, TypeError):
+                with open(os.path.join(git_path, chart, manifest)) as manifest_file:
+                    dependencies = yaml.safe_load(manifest_file).get("dependencies") or []
+                for dependency in dependencies:
+                    repository = dependency.get("repository") or ""
+                    if repository.startswith("file://"):
+                        charts.append(os.path.join(chart, repository[len("file://"):]))
+    return True
 
 
 @contextmanager
-def clone_and_checkout(githash, repo_name=None, debug=ALADDIN_DEV, cwd=False):
+def clone_and_checkout(githash, repo_name=None, debug=ALADDIN_DEV, cwd=False, sparse=False):
+    """
+    Check out githash of repo_name (defaults to the current repo) in a temporary directory,
+    unless the current repo is already at githash
+
+    sparse: only check out lamp.json and the helm charts (see Git.sparse_checkout)
+    """
     current_hash = None
     current_repo = None
     with suppress(subprocess.CalledProcessError):
@@ -123,19 +358,28 @@ def clone_and_checkout(githash, repo_name=None, debug=ALADDIN_DEV, cwd=False):
     git_account = load_git_configs()["account"]
     git_url = f"git@github.com:{git_account}/{repo_name}.git"
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        try:
-            Git.clone(git_url, tmpdirname)
-        except subprocess.CalledProcessError:
-            logging.warn(f"Could not clone repo {git_url}. Does it exist?")
-            return sys.exit(1)
-        try:
-            Git.checkout(tmpdirname, githash)
-        except subprocess.CalledProcessError:
-            logging.warn(
-                f"Could not checkout to ref '{githash}' in repo {git_url}. Have you pushed it to remote?"
-            )
-            return sys.exit(1)
+    checkout = Git.sparse_checkout if sparse else Git.checkout
+    with tempfile.TemporaryDirectory() as tmpdirname, tracing.span(
+        f"clone {repo_name}", ref=githash
+    ) as clone_span, git_cache.shared_clone(
+        git_url, tmpdirname, githash, partial=sparse, checkout=checkout
+    ) as cloned:
+        if not cloned:
+            try:
+                Git.clone(git_url, tmpdirname, partial=sparse)
+            except subprocess.CalledProcessError:
+                logging.warn(f"Could not clone repo {git_url}. Does it exist?")
+                return sys.exit(1)
+            try:
+                checkout(tmpdirname, githash)
+            except subprocess.CalledProcessError:
+                logging.warn(
+                    f"Could not checkout to ref '{githash}' in repo {git_url}. Have you pushed it to remote?"
+                )
+                return sys.exit(1)
+        if clone_span:
+            # only the clone, not what's done with it
+            clone_span.end()
         context = working_directory(tmpdirname) if cwd else nullcontext()
         with context:
             yield tmpdirname
@@ -0,0 +1,228 @@
+"""
+Local cache of the project repos used by clone_and_checkout
+
+Each repo is kept as a bare mirror under ~/.aladdin/cache/git, updated with incremental
+fetches, and checked out with "git clone --shared" (which borrows the mirror's objects
+instead of copying them) so deploying the same repo again only costs a checkout.
+
+Two locks per mirror allow several aladdin processes to share the cache:
+- the fetch lock (exclusive) serializes creating and fetching the mirror
+- the use lock is held (shared) for as long as a clone borrows objects from the mirror,
+  the mirror is only evicted when nobody holds it
+
+Submodules are cloned from their mirror too (see Git.init_submodules), these clones copy
+(or hardlink) the objects so they don't depend on the mirror afterwards.
+
+Deploys only need a few files of the repo, they use a separate blob-less (partial) mirror
+and the clones download the blobs they check out from the real remote.
+
+Mirrors never run "git gc" on their own (gc.auto 0) since removing objects would
+break the clones borrowing them. The least recently used mirrors are evicted when the
+cache grows over "git_cache_max_size" MB (user config, 10GB by default).
+"""
+import fcntl
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+from contextlib import contextmanager, suppress
+
+from aladdin import config
+from aladdin.lib import logging
+from aladdin.lib.utils import strtobool
+
+logger = logging.getLogger(__name__)
+
+cache_root = pathlib.Path.home() / ".aladdin" / "cache" / "git"
+DEFAULT_MAX_SIZE_MB = 10 * 1024
+# Full or abbreviated commit hashes (Git.extract_hash gives 10 characters). All-digit refs
+# are excluded, they are more likely to be tags (e.g. dates) than abbreviated hashes.
+_HASH_RE = re.compile(r"^(?=.*[a-f])[0-9a-f]{7,64}$")
+
+
+def mirror_path(git_url: str, partial: bool = False) -> pathlib.Path:
+    """git@github.com:account/repo.git -> ~/.aladdin/cache/git/github.com_account_repo.git"""
+    name = re.sub(r"^.*@", "", git_url)
+    name = re.sub(r"\.git$", "", name)
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+    return cache_root / f"{name}{'.partial' if partial else ''}.git"
+
+
+@contextmanager
+def _lock(path: pathlib.Path, operation: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _git(*args, cwd=None, capture=False):
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        encoding="utf-8",
+        stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    ).stdout
+
+
+def _has_commit(mirror: pathlib.Path, ref: str) -> bool:
+    """Whether ref is a (possibly abbreviated) commit hash the mirror already has"""
+    if not _HASH_RE.match(ref):
+        # branches and tags can move, the mirror may have an old version of them
+        return False
+    try:
+        commit = _git(
+            "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}", cwd=mirror, capture=True
+        )
+    except subprocess.CalledProcessError:
+        # unknown or ambiguous
+        return False
+    # rev-parse resolves branch and tag names before hashes
+    return commit.strip().startswith(ref)
+
+
+def update_mirror(git_url: str, ref: str = None, partial: bool = False) -> pathlib.Path:
+    """
+    Create or fetch the mirror of git_url, unless "ref" is a commit hash (full or
+    abbreviated) the mirror already has (a branch or tag name is always fetched)
+
+    Must be called with the mirror's use lock held
+    """
+    mirror = mirror_path(git_url, partial)
+    with _lock(mirror.with_suffix(".fetch.lock"), fcntl.LOCK_EX):
+        if not mirror.is_dir():
+            logger.info("Creating a local mirror of %s", git_url)
+            tmp_mirror = mirror.with_suffix(f".{os.getpid()}.tmp")
+            shutil.rmtree(tmp_mirror, ignore_errors=True)
+            filter_args = ["--filter=blob:none"] if partial else []
+            try:
+                _git("clone", "--mirror", "--quiet", *filter_args, git_url, str(tmp_mirror))
+                _git("config", "gc.auto", "0", cwd=tmp_mirror)
+                os.rename(tmp_mirror, mirror)
+            finally:
+                shutil.rmtree(tmp_mirror, ignore_errors=True)
+        elif not ref or not _has_commit(mirror, ref):
+            logger.info("Fetching %s", git_url)
+            _git("fetch", "--prune", "--quiet", "origin", cwd=mirror)
+    # used for the LRU eviction
+    (mirror / "aladdin-last-used").touch()
+    return mirror
+
+
+def _checkout(dest, ref):
+    _git("checkout", "--quiet", ref, cwd=dest)
+
+
+@contextmanager
+def local_mirror(git_url: str, ref: str = None, partial: bool = False):
+    """
+    Yield the path of the mirror of git_url, updated to have the commit "ref"
+
+    The mirror can't be evicted until the context exits. Yields None if the cache is
+    disabled or the mirror couldn't be updated, so the caller can use git_url directly
+    """
+    if strtobool(os.getenv("ALADDIN_DISABLE_GIT_CACHE", "false")):
+        yield None
+        return
+
+    mirror = mirror_path(git_url, partial)
+    updated = False
+    try:
+        with _lock(mirror.with_suffix(".use.lock"), fcntl.LOCK_SH):
+            try:
+                update_mirror(git_url, ref, partial)
+                updated = True
+            except (OSError, subprocess.CalledProcessError) as e:
+                stderr = getattr(e, "stderr", None) or str(e)
+                logger.warning("Could not use the git cache for %s: %s", git_url, stderr.strip())
+            yield mirror if updated else None
+    finally:
+        if updated:
+            with suppress(OSError):
+                evict(keep=mirror)
+
+
+@contextmanager
+def shared_clone(git_url: str, dest: str, ref: str, partial: bool = False, checkout=_checkout):
+    """
+    Clone git_url in dest (an empty directory) from the local mirror and checkout(dest, ref)
+
+    partial: use the blob-less mirror, the blobs are downloaded from git_url on checkout
+
+    Yields whether the clone succeeded, dest is left empty if it didn't so the caller
+    can fall back to a regular clone
+    """
+    with local_mirror(git_url, ref, partial) as mirror:
+        if not mirror:
+            yield False
+            return
+        cloned = False
+        try:
+            _git("clone", "--shared", "--no-checkout", "--quiet", str(mirror), dest)
+            # Point origin to the real remote so the clone behaves like a regular one
+            _git("remote", "set-url", "origin", git_url, cwd=dest)
+            if partial:
+                # Missing blobs are fetched from the real remote
+                _git("config", "remote.origin.promisor", "true", cwd=dest)
+                _git("config", "remote.origin.partialclonefilter", "blob:none", cwd=dest)
+                _git("config", "extensions.partialClone", "origin", cwd=dest)
+            checkout(dest, ref)
+            cloned = True
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None) or str(e)
+            logger.warning("Could not use the git cache for %s: %s", git_url, stderr.strip())
+            shutil.rmtree(dest, ignore_errors=True)
+            os.makedirs(dest, exist_ok=True)
+        yield cloned
+
+
+def _size(path: pathlib.Path) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            with suppress(OSError):
+                size += os.lstat(os.path.join(root, name)).st_size
+    return size
+
+
+def _last_used(mirror: pathlib.Path) -> float:
+    try:
+        return (mirror / "aladdin-last-used").stat().st_mtime
+    except OSError:
+        return 0
+
+
+def evict(keep: pathlib.Path = None):
+    """Remove the least recently used mirrors (other than keep) until the cache fits"""
+    try:
+        # not load_user_config, which creates the user config if it is missing
+        user_config = config.load_config_from_file(
+            pathlib.Path.home() / ".aladdin/config/config.json"
+        )
+        max_size = int(user_config.get("git_cache_max_size", DEFAULT_MAX_SIZE_MB))
+    except (FileNotFoundError, ValueError):
+        max_size = DEFAULT_MAX_SIZE_MB
+    mirrors = sorted(cache_root.glob("*.git"), key=_last_used)
+    sizes = {mirror: _size(mirror) for mirror in mirrors}
+    total = sum(sizes.values())
+    for mirror in mirrors:
+        if total <= max_size * 1024 * 1024:
+            break
+        if mirror == keep:
+            continue
+        try:
+            # skip mirrors in use by other processes
+            with _lock(mirror.with_suffix(".use.lock"), fcntl.LOCK_EX | fcntl.LOCK_NB), _lock(
+                mirror.with_suffix(".fetch.lock"), fcntl.LOCK_EX | fcntl.LOCK_NB
+            ):
+                logger.info("Evicting %s from the git cache", mirror.name)
+                shutil.rmtree(mirror)
+        except BlockingIOError:
+            continue
+        total -= sizes[mirror]
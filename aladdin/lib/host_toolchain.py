@@ -0,0 +1,252 @@
+"""
+Run aladdin commands natively on the host
+
+Commands decorated with container_command(native=...) don't need the aladdin container
+when the host has a compatible toolchain (the kubectl and helm versions pinned in
+scripts/infra_k8s_check.sh, a recent enough git and the exec plugins of the kubeconfig) and
+a kubeconfig for the cluster (the one exported by the aladdin container for remote clusters).
+
+Clusters with authentication_enabled always use the container: the exported kubeconfig has
+admin credentials, the container switches to the authentication_aladdin_role user.
+
+Like in the container, the kube context and the namespace are pinned: the "rancher-desktop"
+context for LOCAL (other local cluster providers use the container), the exported context
+for remote clusters, and NAMESPACE or "default". The context is given to the kubernetes
+client, kubectl and helm (ALADDIN_KUBE_CONTEXT and HELM_KUBECONTEXT).
+"""
+import json
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import time
+from contextlib import suppress
+
+from aladdin.config import PROJECT_ROOT
+from aladdin.lib import logging
+from aladdin.lib.arg_tools import get_current_namespace
+from aladdin.lib.utils import strtobool
+
+logger = logging.getLogger(__name__)
+
+TOOLCHAIN_CACHE_PATH = pathlib.Path.home() / ".aladdin" / "cache" / "toolchain.json"
+MIN_GIT_VERSION = (2, 25)
+# Credentials exported by "kops export kubecfg --admin" are valid for 18 hours
+KUBECONFIG_MAX_AGE = 12 * 3600
+# The only local cluster provider whose context the container pins (see aladdin-container.sh)
+LOCAL_KUBE_CONTEXT = "rancher-desktop"
+
+_VERSION_COMMANDS = {
+    "kubectl": ["kubectl", "version", "--client", "-o", "json"],
+    "helm": ["helm", "version", "--template", "{{.Version}}"],
+    "git": ["git", "--version"],
+}
+
+
+def pinned_versions() -> dict:
+    """The kubectl and helm versions installed by infra_k8s_check.sh"""
+    with open(PROJECT_ROOT / "scripts" / "infra_k8s_check.sh") as script:
+        content = script.read()
+    return {
+        tool.lower(): _parse_version(version)
+        for tool, version in re.findall(r'^VERSION_(KUBECTL|HELM)="([^"]+)"', content, re.M)
+    }
+
+
+def _parse_version(version: str):
+    match = re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", version or "")
+    if not match:
+        return None
+    return tuple(int(part or 0) for part in match.groups())
+
+
+def tool_version(tool: str):
+    """
+    The version of a tool installed on the host, None if it is not installed
+
+    Versions are cached by executable path and mtime since "kubectl version" is slow
+    """
+    path = shutil.which(tool)
+    if not path:
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    cache = {}
+    with suppress(OSError, ValueError):
+        with open(TOOLCHAIN_CACHE_PATH) as cache_file:
+            cache = json.load(cache_file)
+    cached = cache.get(tool, {})
+    if cached.get("path") == path and cached.get("mtime") == mtime:
+        return tuple(cached["version"]) if cached["version"] else None
+
+    try:
+        output = subprocess.run(
+            _VERSION_COMMANDS[tool], capture_output=True, check=True, encoding="utf-8"
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if tool == "kubectl":
+        with suppress(ValueError, KeyError):
+            output = json.loads(output)["clientVersion"]["gitVersion"]
+    version = _parse_version(output)
+
+    cache[tool] = {"path": path, "mtime": mtime, "version": version}
+    with suppress(OSError):
+        TOOLCHAIN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(TOOLCHAIN_CACHE_PATH, "w") as cache_file:
+            json.dump(cache, cache_file)
+    return version
+
+
+def incompatible_tools() -> list:
+    """The tools missing from the host or outside of the supported version ranges"""
+    pinned = pinned_versions()
+    ranges = {
+        # kubectl is supported within one minor version of the cluster
+        "kubectl": lambda version: (
+            version[0] == pinned["kubectl"][0] and abs(version[1] - pinned["kubectl"][1]) <= 1
+        ),
+        "helm": lambda version: version[0] == pinned["helm"][0] and version >= pinned["helm"],
+        "git": lambda version: version[:2] >= MIN_GIT_VERSION,
+    }
+    incompatible = []
+    for tool, supported in ranges.items():
+        version = tool_version(tool)
+        if not version or not supported(version):
+            incompatible.append(tool)
+    return incompatible
+
+
+def cluster_name(cluster_code: str) -> str:
+    """The CLUSTER_NAME defined by the cluster's env.sh in the aladdin config"""
+    env_file = os.path.join(os.environ["ALADDIN_CONFIG_DIR"], cluster_code, "env.sh")
+    return subprocess.run(
+        ["bash", "-c", 'source "$0" > /dev/null && echo "${CLUSTER_NAME:-}"', env_file],
+        capture_output=True,
+        check=True,
+        encoding="utf-8",
+    ).stdout.strip()
+
+
+def find_kubeconfig(cluster_code: str, is_local: bool):
+    """
+    The host kubeconfig to use for the cluster, None if there isn't a usable one
+
+    Remote clusters use the kubeconfig saved by the aladdin container (see _get_kubeconfig
+    in aladdin-container.sh) as long as its credentials are recent enough
+    """
+    if is_local:
+        path = os.path.expanduser(os.getenv("KUBECONFIG", "~/.kube/config"))
+        return path if os.path.isfile(path) else None
+
+    try:
+        name = cluster_name(cluster_code)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    path = os.path.expanduser(f"~/.kube/{name}.config")
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except OSError:
+        return None
+    if not name or age > KUBECONFIG_MAX_AGE:
+        return None
+    return path
+
+
+def kube_context(kubeconfig: str, is_local: bool):
+    """
+    The context to pin for the cluster and its user, (None, None) if the kubeconfig
+    doesn't have it
+    """
+    import yaml
+
+    try:
+        with open(kubeconfig) as kubeconfig_file:
+            content = yaml.safe_load(kubeconfig_file) or {}
+        contexts = {
+            item["name"]: item.get("context") or {} for item in content.get("contexts") or []
+        }
+        users = {item["name"]: item.get("user") or {} for item in content.get("users") or []}
+        # the kubeconfig exported for a remote cluster only has the cluster's context
+        name = LOCAL_KUBE_CONTEXT if is_local else content.get("current-context")
+        if name not in contexts:
+            return None, None
+        return name, users.get(contexts[name].get("user"), {})
+    except (OSError, yaml.YAMLError, KeyError, TypeError, AttributeError):
+        return None, None
+
+
+def missing_exec_plugins(user: dict) -> list:
+    """
+    The exec plugins (e.g. aws, aws-iam-authenticator) of a kubeconfig user that are not
+    installed on the host
+    """
+    command = (user.get("exec") or {}).get("command")
+    if command and not shutil.which(command):
+        return [command]
+    return []
+
+
+def authentication_enabled() -> bool:
+    """Whether the cluster's aladdin config sets authentication_enabled"""
+    from aladdin.lib.cluster_rules import ClusterRules
+
+    value = ClusterRules().rules.get("authentication_enabled", False)
+    return strtobool(value) if isinstance(value, str) else bool(value)
+
+
+def configure_native_env() -> bool:
+    """
+    Configure the environment to run a command on the host, return False
+    if the command needs to run in the aladdin container instead
+    """
+    if strtobool(os.getenv("ALADDIN_DISABLE_NATIVE_COMMANDS", "false")):
+        return False
+    if strtobool(os.getenv("IS_PROD", "false")) and not strtobool(
+        os.getenv("SKIP_PROMPTS", "false")
+    ):
+        # production commands are confirmed by aladdin.sh before entering the container
+        return False
+
+    incompatible = incompatible_tools()
+    if incompatible:
+        logger.debug("Host toolchain not compatible (%s)", ", ".join(incompatible))
+        return False
+
+    if authentication_enabled():
+        logger.debug("Authentication is enabled for the cluster, using the aladdin container")
+        return False
+
+    cluster_code = os.environ["CLUSTER_CODE"]
+    is_local = strtobool(os.getenv("IS_LOCAL", "false"))
+    if is_local and os.getenv("LOCAL_CLUSTER_PROVIDER") != LOCAL_KUBE_CONTEXT:
+        logger.debug("Local cluster provider not supported on the host, using the container")
+        return False
+    kubeconfig = find_kubeconfig(cluster_code, is_local)
+    if not kubeconfig:
+        logger.debug("No recent kubeconfig found for cluster %s on the host", cluster_code)
+        return False
+    context, user = kube_context(kubeconfig, is_local)
+    if not context:
+        logger.debug("No context for cluster %s in %s", cluster_code, kubeconfig)
+        return False
+    missing = missing_exec_plugins(user)
+    if missing:
+        logger.debug("Kubeconfig exec plugins not installed (%s)", ", ".join(missing))
+        return False
+
+    # The namespace arguments default to the namespace of the current kube context, the
+    # container defaults them to NAMESPACE or "default" (see aladdin.sh)
+    if not (os.getenv("HELM_NAMESPACE") or os.getenv("NAMESPACE")):
+        if get_current_namespace() != "default":
+            logger.debug("The current kube context has another namespace, using the container")
+            return False
+        os.environ["NAMESPACE"] = "default"
+
+    logger.debug("Running natively on the host with context %s of %s", context, kubeconfig)
+    os.environ["KUBECONFIG"] = kubeconfig
+    os.environ["ALADDIN_KUBE_CONTEXT"] = context
+    os.environ["HELM_KUBECONTEXT"] = context
+    os.environ["ALADDIN_DIR"] = str(PROJECT_ROOT)
+    os.environ["SCRIPT_DIR"] = str(PROJECT_ROOT / "scripts")
+    return True
@@ -0,0 +1,127 @@
+"""
+Process wide pool of kubernetes ApiClients, keyed by (kubeconfig, context)
+
+Loading a kubeconfig is slow: it is parsed again, its auth exec plugin (e.g. "aws eks
+get-token") runs again and the new client opens new TLS connections. Kubernetes() objects are
+built by commands that call each other (deploy -> sync_ingress, environment -> refresh...),
+they all share the client loaded the first time, and its urllib3 connection pool.
+
+Clients are reloaded after MAX_CLIENT_AGE, before the exec plugins' tokens expire (15
+minutes for EKS): the old client is closed, only its request counts are kept for stats().
+Forked processes start with an empty pool: the connections of the parent process can't be
+shared.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import namedtuple
+
+from aladdin.lib import logging, tracing
+
+logger = logging.getLogger(__name__)
+
+MAX_CLIENT_AGE = 10 * 60
+
+# clients: the clients loaded, reuses: the times a loaded client was returned,
+# requests: the requests made by the clients, connections: the connections they opened
+PoolStats = namedtuple("PoolStats", ["clients", "reuses", "requests", "connections"])
+
+_lock = threading.Lock()
+_clients = {}
+_reuses = 0
+# the stats of the clients closed after MAX_CLIENT_AGE
+_retired = PoolStats(0, 0, 0, 0)
+
+
+class ClientConfigurationError(Exception):
+    pass
+
+
+def get_api_client(kubeconfig: str = None, context: str = None):
+    """The shared ApiClient for the kubeconfig (or the in-cluster config) and context"""
+    global _reuses
+    key = (kubeconfig, context)
+    with _lock:
+        if key in _clients:
+            api_client, loaded_at = _clients[key]
+            if time.time() - loaded_at < MAX_CLIENT_AGE:
+                _reuses += 1
+                return api_client
+            _retire(_clients.pop(key)[0])
+        api_client = _load_api_client(kubeconfig, context)
+        if not _clients and not _retired.clients:
+            atexit.register(_log_stats)
+        _clients[key] = (api_client, time.time())
+        return api_client
+
+
+def _load_api_client(kubeconfig, context):
+    # kubernetes is slow to import, only import it when a client is needed
+    from kubernetes import client, config
+
+    configuration = client.Configuration()
+    try:
+        config.load_kube_config(kubeconfig, context=context, client_configuration=configuration)
+    except Exception:
+        try:
+            # How to set up the client from within a k8s pod
+            config.load_incluster_config(client_configuration=configuration)
+        except config.config_exception.ConfigException:
+            raise ClientConfigurationError("Could not configure kubernetes python client")
+    return tracing.trace_kubernetes(client.ApiClient(configuration))
+
+
+def _retire(api_client):
+    """Close a client (and its connections), keep its request counts. Called with _lock held"""
+    global _retired
+    requests, connections = _request_counts(api_client)
+    _retired = PoolStats(
+        _retired.clients + 1, 0, _retired.requests + requests, _retired.connections + connections
+    )
+    # close() only stops the client's thread pool, clear() closes its connections
+    api_client.close()
+    api_client.rest_client.pool_manager.clear()
+
+
+def _request_counts(api_client):
+    requests = connections = 0
+    pools = api_client.rest_client.pool_manager.pools
+    # keys() is the only thread safe way to go through urllib3's pools
+    for pool in filter(None, map(pools.get, pools.keys())):
+        requests += pool.num_requests
+        connections += pool.num_connections
+    return requests, connections
+
+
+def stats() -> PoolStats:
+    with _lock:
+        clients, requests, connections = _retired.clients, _retired.requests, _retired.connections
+        for api_client, _ in _clients.values():
+            client_requests, client_connections = _request_counts(api_client)
+            clients += 1
+            requests += client_requests
+            connections += client_connections
+        return PoolStats(clients, _reuses, requests, connections)
+
+
+def _log_stats():
+    if not tracing.enabled():
+        return
+    pool_stats = stats()
+    logger.info(
+        "kubernetes: %d api clients loaded, reused %d times, %d requests over %d connections",
+        *pool_stats,
+    )
+
+
+def _reset():
+    global _lock, _reuses, _retired
+    # the lock may have been held by another thread of the parent process
+    _lock = threading.Lock()
+    _clients.clear()
+    _reuses = 0
+    _retired = PoolStats(0, 0, 0, 0)
+
+
+os.register_at_fork(after_in_child=_reset)
@@ -1,14 +1,91 @@
 #!/usr/bin/env python3
+import hashlib
 import json
 import os
 import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join
-from typing import List
+from typing import List, Optional
 
+from aladdin import __version__
 from aladdin.lib import logging
 
 logger = logging.getLogger(__name__)
 
+# the release label holding the digest of what a release was deployed from (helm >= 3.13)
+DIGEST_LABEL = "aladdin-deploy-digest"
+DIGEST_LENGTH = 63
+
+
+class HelmInventory:
+    """
+    The helm releases of the cluster, listed with one (paged) "helm list" per command
+
+    Answers the release existence, revision and status queries without a "helm status"
+    per release. Must be invalidated after installing, upgrading or deleting a release.
+    """
+
+    PAGE_SIZE = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._releases = None
+        # namespaces listed one by one when we can't list the releases of every namespace
+        self._namespaces = {}
+        self._all_namespaces = True
+
+    def invalidate(self):
+        with self._lock:
+            self._releases = None
+            self._namespaces = {}
+
+    def get(self, release_name: str, namespace: str) -> Optional[dict]:
+        """
+        The "helm list" entry of the release, None if it doesn't exist
+
+        Raises subprocess.CalledProcessError if the releases can't be listed
+        """
+        with self._lock:
+            if self._all_namespaces and self._releases is None:
+                try:
+                    self._releases = self._list(["--all-namespaces"])
+                except subprocess.CalledProcessError as e:
+                    logger.debug("Could not list the helm releases of all namespaces: %s", e.stderr)
+                    self._all_namespaces = False
+            if self._all_namespaces:
+                releases = self._releases
+            else:
+                if namespace not in self._namespaces:
+                    self._namespaces[namespace] = self._list(["--namespace", namespace])
+                releases = self._namespaces[namespace]
+        return releases.get((namespace, release_name))
+
+    def _list(self, scope: list) -> dict:
+        releases = {}
+        offset = 0
+        while True:
+            output = subprocess.run(
+                [
+                    "helm", "list", *scope, "--all", "--output", "json",
+                    "--max", str(self.PAGE_SIZE), "--offset", str(offset),
+                ],
+                check=True,
+                capture_output=True,
+                encoding="utf-8",
+            ).stdout
+            page = json.loads(output or "[]")
+            for release in page:
+                releases[(release["namespace"], release["name"])] = release
+            if len(page) < self.PAGE_SIZE:
+                return releases
+            offset += len(page)
+
+
+inventory = HelmInventory()
+
 
 class Helm:
     def find_values(self, chart_path: str, values_files: List[str], namespace: str):
@@ -84,12 +161,53 @@ class Helm:
 
         return values
 
-    def stop(self, release_name, namespace):
+    def run_concurrently(self, operations: dict, max_workers: int = 8):
+        """
+        Run the helm operations {name: function(output=...)} at the same time, each operation
+        writes its output to the file it is given, printed once the operation is done so
+        the outputs don't interleave
+
+        Raises the first error once all the operations are done
+        """
+        if len(operations) == 1:
+            for operation in operations.values():
+                return [operation(output=None)]
+
+        def run(name, operation):
+            with tempfile.TemporaryFile(mode="w+") as output:
+                try:
+                    return operation(output=output)
+                finally:
+                    output.seek(0)
+                    with print_lock:
+                        sys.stdout.write(f"==> {name}\n{output.read()}")
+                        sys.stdout.flush()
+
+        print_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(run, name, operation) for name, operation in operations.items()
+            ]
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            raise errors[0]
+        return [future.result() for future in futures]
+
+    def stop(self, release_name, namespace, output=None):
+        """output: file to write helm's output to, defaults to stdout"""
 
         command = ["helm", "delete", release_name, "--namespace", namespace]
 
         if self.release_exists(release_name, namespace):
-            subprocess.run(command, check=True)
+            try:
+                subprocess.run(
+                    command,
+                    check=True,
+                    stdout=output,
+                    stderr=subprocess.STDOUT if output else None,
+                )
+            finally:
+                inventory.invalidate()
             logger.info("Successfully removed release {}".format(release_name))
         else:
             logger.warning(
@@ -97,6 +215,11 @@ class Helm:
             )
 
     def release_exists(self, release_name, namespace):
+        try:
+            return inventory.get(release_name, namespace) is not None
+        except (subprocess.CalledProcessError, ValueError):
+            pass
+
         command = ["helm", "status", release_name, "--namespace", namespace]
 
         ret_code = subprocess.run(
@@ -108,11 +231,20 @@ class Helm:
         else:
             return False
 
+    def release_revision(self, release_name, namespace) -> Optional[int]:
+        release = inventory.get(release_name, namespace)
+        return int(release["revision"]) if release else None
+
+    def release_status(self, release_name, namespace) -> Optional[str]:
+        release = inventory.get(release_name, namespace)
+        return release["status"] if release else None
+
     def rollback_relative(self, release_name, num_versions, namespace):
 
-        helm_list_command = ["helm", "list", "--namespace", namespace, "-o", "json"]
-        output = json.loads(subprocess.run(helm_list_command, capture_output=True).stdout)
-        current_revision = int([k["revision"] for k in output if k["name"] == release_name][0])
+        current_revision = self.release_revision(release_name, namespace)
+        if current_revision is None:
+            logger.warning("Could not find release %s", release_name)
+            return
 
         if num_versions > current_revision:
             logger.warning("Can't rollback that far")
@@ -122,7 +254,65 @@ class Helm:
 
     def rollback(self, release_name, revision, namespace):
         command = ["helm", "rollback", release_name, str(revision), "--namespace", namespace]
-        subprocess.run(command, check=True)
+        try:
+            subprocess.run(command, check=True)
+        finally:
+            inventory.invalidate()
+
+    def deploy_digest(
+        self,
+        chart_path: str,
+        values_files: List[str],
+        namespace: str,
+        helm_args: list,
+        values: dict,
+    ) -> str:
+        """
+        Digest of everything a release of chart_path is rendered from: the chart's files, the
+        values files found by find_values, the helm arguments (with the content of the local
+        values files they pass) and the values set by aladdin (image tag included)
+
+        Files are identified by their path relative to the chart or to the aladdin config,
+        deploy checks the project out in a new temporary directory every time
+        """
+        digest = hashlib.sha256(__version__.encode())
+
+        def add_file(path):
+            digest.update(_digest_name(path, chart_path).encode())
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+
+        for root, dirs, files in os.walk(chart_path):
+            dirs.sort()
+            for name in sorted(files):
+                add_file(os.path.join(root, name))
+        for path in self.find_values(chart_path, values_files, namespace):
+            add_file(path)
+        for arg in helm_args:
+            if arg.startswith("--values=") and os.path.isfile(arg[len("--values="):]):
+                digest.update(b"--values=")
+                add_file(arg[len("--values="):])
+            else:
+                digest.update(arg.encode())
+        digest.update(json.dumps(values, sort_keys=True, default=str).encode())
+        # release label values are limited to 63 characters
+        return digest.hexdigest()[:DIGEST_LENGTH]
+
+    def deployed_digest(self, release_name: str, namespace: str) -> Optional[str]:
+        """The digest stored by upgrade on the release, if its last revision was deployed"""
+        try:
+            if self.release_status(release_name, namespace) != "deployed":
+                return None
+            output = subprocess.run(
+                ["helm", "get", "metadata", release_name, "--namespace", namespace, "-o", "json"],
+                check=True,
+                capture_output=True,
+                encoding="utf-8",
+            ).stdout
+            # helm versions that don't show the labels never skip the upgrade
+            return ((json.loads(output or "{}") or {}).get("labels") or {}).get(DIGEST_LABEL)
+        except (subprocess.CalledProcessError, ValueError, AttributeError):
+            return None
 
     def upgrade(
         self,
@@ -132,10 +322,23 @@ class Helm:
         force=False,
         dry_run=False,
         helm_args: list = None,
+        output=None,
+        digest: str = None,
         **values,
     ):
-        if helm_args is None:
-            helm_args = []
+        """
+        output: file to write helm's output to, defaults to stdout
+        digest: see deploy_digest, stored as a label of the release (not as a value, charts
+        may not allow extra values), the upgrade is skipped if the deployed release has the
+        same digest (unless forced)
+        """
+        if digest and not force and not dry_run:
+            if self.deployed_digest(release_name, namespace) == digest:
+                logger.info("Release %s is up to date, skipping the upgrade", release_name)
+                return None
+        helm_args = list(helm_args or [])
+        if digest:
+            helm_args.append(f"--labels={DIGEST_LABEL}={digest}")
         if force:
             helm_args.append("--force")
         if dry_run:
@@ -155,7 +358,16 @@ class Helm:
             command.extend(helm_args)
 
         logger.info("Executing: %s", " ".join(command))
-        return subprocess.run(["helm", *command], check=True)
+        try:
+            return subprocess.run(
+                ["helm", *command],
+                check=True,
+                stdout=output,
+                stderr=subprocess.STDOUT if output else None,
+            )
+        finally:
+            if not dry_run:
+                inventory.invalidate()
 
     def prepare_command(
         self,
@@ -176,3 +388,17 @@ class Helm:
             base_command.extend(helm_args)
 
         return base_command
+
+
+def _digest_name(path: str, chart_path: str) -> str:
+    """The name of a file in a digest: its path in the chart or in the aladdin config"""
+    path = os.path.realpath(path)
+    roots = [("chart", chart_path), ("config", os.getenv("ALADDIN_CONFIG_DIR"))]
+    for name, root in roots:
+        if not root:
+            continue
+        root = os.path.realpath(root)
+        if os.path.commonpath([path, root]) == root:
+            return f"{name}:{os.path.relpath(path, root)}"
+    # elsewhere (e.g. a user's values file), only the content counts
+    return "file"
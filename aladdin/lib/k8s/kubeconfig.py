@@ -0,0 +1,88 @@
+"""
+Process-wide cache of the kubeconfig contexts
+
+Parsing a kubeconfig with dozens of contexts is slow, so the parsed contexts are kept
+for the lifetime of the process and only re-read if one of the files changed
+(based on their mtime and size).
+
+The contexts are read with yaml rather than the kubernetes client, which takes several
+hundred milliseconds to import.
+"""
+import os
+import threading
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class KubeconfigError(Exception):
+    pass
+
+
+def kubeconfig_paths():
+    """The kubeconfig files in use, following the same rules as the kubernetes client"""
+    kubeconfig = os.getenv("KUBECONFIG", "~/.kube/config")
+    return tuple(os.path.expanduser(path) for path in kubeconfig.split(os.pathsep) if path)
+
+
+def _signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append((path, None, None))
+        else:
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def list_contexts():
+    """
+    Cached version of kubernetes.config.list_kube_config_contexts
+
+    Returns a tuple of (contexts, active_context), raises KubeconfigError if there is no
+    usable kubeconfig
+    """
+    paths = kubeconfig_paths()
+    signature = _signature(paths)
+    with _lock:
+        if _cache.get(paths, (None,))[0] == signature:
+            return _cache[paths][1]
+
+    contexts = _read_contexts(paths)
+    with _lock:
+        _cache[paths] = (signature, contexts)
+    return contexts
+
+
+def _read_contexts(paths):
+    """Merge the contexts of the kubeconfig files like kubectl: the first definition wins"""
+    import yaml
+
+    contexts = {}
+    current_context = None
+    for path in paths:
+        try:
+            with open(path) as kubeconfig_file:
+                content = yaml.safe_load(kubeconfig_file) or {}
+        except FileNotFoundError:
+            continue
+        except (OSError, yaml.YAMLError) as e:
+            raise KubeconfigError(f"Invalid kubeconfig {path}: {e}")
+        if not isinstance(content, dict):
+            raise KubeconfigError(f"Invalid kubeconfig {path}")
+        current_context = current_context or content.get("current-context")
+        for context in content.get("contexts") or []:
+            if isinstance(context, dict) and context.get("name"):
+                contexts.setdefault(context["name"], context)
+    if not contexts:
+        raise KubeconfigError("No kubeconfig contexts found")
+    if current_context not in contexts:
+        raise KubeconfigError(f"Current context {current_context} not found in the kubeconfig")
+    return list(contexts.values()), contexts[current_context]
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -5,9 +5,14 @@ import sys
 import time
 
 from kubernetes.client import configuration
-from kubernetes import config, client
+from kubernetes.client.rest import ApiException
+from kubernetes import client
 
 from aladdin.lib.arg_tools import get_current_namespace
+from aladdin.lib.k8s import client_pool
+
+# the objects listed per request, the lists are paginated
+LIST_PAGE_SIZE = 500
 
 
 class KubernetesException(Exception):
@@ -27,21 +32,22 @@ class Kubernetes(object):
         default_project_label=None,
         namespace=None,
         kubeconfig=None,
+        context=None,
     ):
         self.default_component_label = default_component_label or "app"
         self.default_project_label = default_project_label or "project"
         self.kubeconfig = kubeconfig or os.getenv("KUBECONFIG")
+        # None for the kubeconfig's current context, native commands pin it (see host_toolchain)
+        self.context = context or os.getenv("ALADDIN_KUBE_CONTEXT")
         try:
-            config.load_kube_config(self.kubeconfig)
-        except Exception:
-            try:
-                config.load_incluster_config()  # How to set up the client from within a k8s pod
-            except config.config_exception.ConfigException:
-                raise KubernetesException("Could not configure kubernetes python client")
+            # shared by all the Kubernetes objects of the process, see client_pool
+            self.api_client = client_pool.get_api_client(self.kubeconfig, self.context)
+        except client_pool.ClientConfigurationError as e:
+            raise KubernetesException(str(e))
         configuration.assert_hostname = False
-        self.core_v1_api = client.CoreV1Api()
-        self.apps_v1_api = client.AppsV1Api()
-        self.networking_v1_api = client.NetworkingV1Api()
+        self.core_v1_api = client.CoreV1Api(self.api_client)
+        self.apps_v1_api = client.AppsV1Api(self.api_client)
+        self.networking_v1_api = client.NetworkingV1Api(self.api_client)
         self.namespace = namespace or get_current_namespace()
 
     def _kub_cmd(self, *args):
@@ -49,6 +55,8 @@ class Kubernetes(object):
         res = ["kubectl", "--namespace=" + self.namespace]
         if self.kubeconfig:
             res.append("--kubeconfig=" + self.kubeconfig)
+        if self.context:
+            res.append("--context=" + self.context)
         res.extend(args)
         return res
 
@@ -89,7 +97,9 @@ class Kubernetes(object):
             cmd.extend(["-c", container_name])
         if deployment_name:
             cmd.extend(["-l", "app={}".format(deployment_name)])
-        cmd.extend(["-k", color])
+        cmd.extend(["-k", color, "-n", self.namespace])
+        if self.context:
+            cmd.extend(["-t", self.context])
 
         # Call kubetail.sh script
         f = subprocess.Popen(cmd, bufsize=0, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
@@ -97,21 +107,59 @@ class Kubernetes(object):
         for line in f.stdout:
             sys.stdout.write(line.decode("utf-8"))
 
-    def get_objects(self, obj_type, label_val=None, label_key=None):
+    def _api_func(self, action, obj_type):
         # obj_type should be the full name singular of the object, i.e. pod, secret, service, deploy
         # Check https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/
         # docs/CoreV1Api.md if you are not sure
-        if not label_key:
-            label_key = self.default_component_label
-        get_func_name = "list_namespaced_%s" % obj_type
+        func_name = "%s_namespaced_%s" % (action, obj_type)
         # Ingress and Deployment are the only k8s objs we care about not in the core_v1_api for
         # some reason, so we use other appropriate clients here
         if obj_type == "deployment":
-            get_func = getattr(self.apps_v1_api, get_func_name)
-        elif obj_type == "ingress":
-            get_func = getattr(self.networking_v1_api, get_func_name)
-        else:
-            get_func = getattr(self.core_v1_api, get_func_name)
+            return getattr(self.apps_v1_api, func_name)
+        if obj_type == "ingress":
+            return getattr(self.networking_v1_api, func_name)
+        return getattr(self.core_v1_api, func_name)
+
+    def iter_objects(
+        self, obj_type, label_val=None, label_key=None, field_selector=None, limit=None
+    ):
+        """
+        Yield the objects one page (of LIST_PAGE_SIZE objects) at a time, up to limit objects.
+        field_selector is a kubernetes field selector, e.g. "status.phase=Running"
+        """
+        list_func = self._api_func("list", obj_type)
+        label_selector = self._label_selector(label_val, label_key)
+        kwargs = {"label_selector": label_selector}
+        if field_selector:
+            kwargs["field_selector"] = field_selector
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = LIST_PAGE_SIZE if remaining is None else min(remaining, LIST_PAGE_SIZE)
+            page = list_func(self.namespace, limit=page_size, **kwargs)
+            yield from page.items
+            if remaining is not None:
+                remaining -= len(page.items)
+            if not page.metadata._continue:
+                return
+            kwargs["_continue"] = page.metadata._continue
+
+    def get_objects(
+        self, obj_type, label_val=None, label_key=None, field_selector=None, limit=None
+    ):
+        return list(self.iter_objects(obj_type, label_val, label_key, field_selector, limit))
+
+    def get_object(self, obj_type, name, default=None):
+        """Read an object by name, default if it doesn't exist"""
+        try:
+            return self._api_func("read", obj_type)(name, self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return default
+            raise
+
+    def _label_selector(self, label_val=None, label_key=None):
+        if not label_key:
+            label_key = self.default_component_label
         # Create a label selector filter if label_val was specified
         label_selector = ""
         # Check if we have multiple label/selector pairs
@@ -126,18 +174,17 @@ class Kubernetes(object):
             )
         elif label_val:
             label_selector = "{0}={1}".format(label_key, label_val)
-        objs = get_func(self.namespace, label_selector=label_selector).items
-        return objs
+        return label_selector
 
     # TODO: make this into a __getattr__ possibly to remove duplicate code
     def get_pods(self, label_val=None, label_key=None):
         return self.get_objects("pod", label_val, label_key)
 
     def get_pod(self, label_val=None, label_key=None, default=None):
-        return (self.get_pods(label_val, label_key) + [default])[0]
+        return (self.get_objects("pod", label_val, label_key, limit=1) + [default])[0]
 
     def get_pod_by_name(self, name, default=None):
-        return ([pod for pod in self.get_pods() if pod.metadata.name == name] + [default])[0]
+        return self.get_object("pod", name, default)
 
     def get_pod_name(self, label_val=None, label_key=None, default=None):
         pod = self.get_pod(label_val, label_key)
@@ -155,13 +202,13 @@ class Kubernetes(object):
         return self.get_objects("secret", label_val, label_key)
 
     def get_secret(self, label_val=None, label_key=None, default=None):
-        return (self.get_secrets(label_val, label_key) + [default])[0]
+        return (self.get_objects("secret", label_val, label_key, limit=1) + [default])[0]
 
     def get_services(self, label_val=None, label_key=None):
         return self.get_objects("service", label_val, label_key)
 
     def get_service(self, label_val=None, label_key=None, default=None):
-        return (self.get_services(label_val, label_key) + [default])[0]
+        return (self.get_objects("service", label_val, label_key, limit=1) + [default])[0]
 
     def update_service(self, name, body):
         self.core_v1_api.patch_namespaced_service(name, self.namespace, body)
@@ -170,7 +217,7 @@ class Kubernetes(object):
         return self.get_objects("deployment", label_val, label_key)
 
     def get_deployment(self, label_val=None, label_key=None, default=None):
-        return (self.get_deployments(label_val, label_key) + [default])[0]
+        return (self.get_objects("deployment", label_val, label_key, limit=1) + [default])[0]
 
     def get_num_replicas(self, label_val=None, label_key=None, state="ready"):
         deployment_status = self.get_deployment(label_val, label_key).status
@@ -221,7 +268,7 @@ class Kubernetes(object):
         return self.get_objects("config_map", label_val, label_key)
 
     def get_config_map(self, label_val=None, label_key=None, default=None):
-        return (self.get_config_maps(label_val, label_key) + [default])[0]
+        return (self.get_objects("config_map", label_val, label_key, limit=1) + [default])[0]
 
     def create_config_map(self, name, data, labels=None):
         body = client.V1ConfigMap()
@@ -257,7 +304,7 @@ class Kubernetes(object):
         return self.get_objects("ingress", label_val, label_key)
 
     def get_ingress(self, label_val=None, label_key=None, default=None):
-        return (self.get_ingresses(label_val, label_key) + [default])[0]
+        return (self.get_objects("ingress", label_val, label_key, limit=1) + [default])[0]
 
     def create_ingress(self, body):
         self.networking_v1_api.create_namespaced_ingress(self.namespace, body)
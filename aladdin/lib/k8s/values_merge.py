@@ -0,0 +1,237 @@
+"""
+Merge helm values in python, the way "helm template charts/merger" does
+
+helm-values used to render the (empty) merger chart with all the values files and --set
+arguments just to get helm's merged values. This module reproduces helm's semantics:
+
+- values files are deep merged in order: maps are merged, anything else (lists included)
+  is replaced, a null value is kept as null
+- then all the --set arguments are applied in order, then all the --set-string ones
+  (like helm does, whatever their position on the command line)
+- --set/--set-string use helm's syntax: "a.b=1,c[0].d=x", "list={a,b}", "\\" escapes
+  the next character; --set converts true/false/null and integers (not starting with 0),
+  --set-string keeps strings
+
+render raises UnsupportedValues for anything it can't reproduce (templated values, other
+helm flags...) so the caller can fall back to helm.
+"""
+import yaml
+
+# the largest list index helm accepts in --set
+MAX_INDEX = 65536
+TEMPLATE_HEADER = "---\n# Source: merger/templates/values.yaml\n"
+
+
+class UnsupportedValues(Exception):
+    pass
+
+
+class ValuesLoader(yaml.SafeLoader):
+    """Like helm (go-yaml), keep dates as strings"""
+
+
+ValuesLoader.yaml_implicit_resolvers = {
+    first: [(tag, regexp) for tag, regexp in resolvers if tag != "tag:yaml.org,2002:timestamp"]
+    for first, resolvers in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+
+
+def load_values_file(path: str) -> dict:
+    with open(path) as values_file:
+        values = yaml.load(values_file, Loader=ValuesLoader)
+    if values is None:
+        return {}
+    if not isinstance(values, dict):
+        raise UnsupportedValues(f"{path} is not a map of values")
+    return _string_keys(values)
+
+
+def _string_keys(value):
+    """helm converts the YAML to JSON, where all the keys are strings"""
+    if isinstance(value, dict):
+        return {
+            (str(key).lower() if isinstance(key, bool) else str(key)): _string_keys(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_string_keys(item) for item in value]
+    return value
+
+
+def merge_values(base: dict, override: dict) -> dict:
+    """helm's mergeMaps: the values of override take precedence, maps are merged recursively"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_values(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def typed_value(value: str):
+    """The type conversion of helm's --set"""
+    if value.lower() == "true":
+        return True
+    if value.lower() == "false":
+        return False
+    if value.lower() == "null":
+        return None
+    if value == "0":
+        return 0
+    if value and value[0] != "0":
+        try:
+            # like Go's strconv.ParseInt, no "_" separators, no surrounding spaces
+            if value.strip() == value and "_" not in value:
+                parsed = int(value, 10)
+                if -(2 ** 63) <= parsed < 2 ** 63:
+                    return parsed
+        except ValueError:
+            pass
+    return value
+
+
+class _SetParser:
+    """Port of helm's strvals parser, applies one --set expression to a values dict"""
+
+    def __init__(self, expression: str, string: bool):
+        self.chars = expression
+        self.pos = 0
+        self.convert = str if string else typed_value
+
+    def eof(self):
+        return self.pos >= len(self.chars)
+
+    def read_until(self, stops: str):
+        """Read (unescaping) until one of the stop characters, return (text, stop or None)"""
+        text = []
+        while not self.eof():
+            char = self.chars[self.pos]
+            self.pos += 1
+            if char == "\\":
+                if self.eof():
+                    raise UnsupportedValues(f"unterminated escape in {self.chars!r}")
+                text.append(self.chars[self.pos])
+                self.pos += 1
+            elif char in stops:
+                return "".join(text), char
+            else:
+                text.append(char)
+        return "".join(text), None
+
+    def parse(self, data: dict):
+        while not self.eof():
+            self.key(data)
+
+    def value(self):
+        """Read a value (or a {a,b} list), the position ends after the following comma"""
+        if self.chars.startswith("{", self.pos):
+            self.pos += 1
+            items = []
+            while True:
+                item, stop = self.read_until(",}")
+                if stop is None:
+                    raise UnsupportedValues(f"unterminated list in {self.chars!r}")
+                items.append(self.convert(item))
+                if stop == "}":
+                    break
+            if self.chars.startswith(",", self.pos):
+                self.pos += 1
+            return items
+        text, _ = self.read_until(",")
+        return self.convert(text)
+
+    def key(self, data: dict):
+        key, stop = self.read_until("=[.,")
+        if stop is None:
+            if key:
+                raise UnsupportedValues(f"key {key!r} has no value")
+            return
+        if stop == ",":
+            raise UnsupportedValues(f"key {key!r} has no value (cannot end with ,)")
+        if stop == "=":
+            data[key] = self.value()
+        elif stop == ".":
+            if not isinstance(data.get(key), dict):
+                data[key] = {}
+            self.key(data[key])
+        else:
+            current = data.get(key)
+            data[key] = self.list_index(current if isinstance(current, list) else [])
+
+    def list_index(self, items: list) -> list:
+        index, stop = self.read_until("]")
+        if stop is None or not index.isdigit():
+            raise UnsupportedValues(f"invalid list index {index!r} in {self.chars!r}")
+        index = int(index)
+        if index > MAX_INDEX:
+            raise UnsupportedValues(f"list index {index} is too large")
+        items = list(items) + [None] * max(index + 1 - len(items), 0)
+        if self.eof():
+            raise UnsupportedValues(f"list index {index} has no value in {self.chars!r}")
+        char = self.chars[self.pos]
+        self.pos += 1
+        if char == "=":
+            items[index] = self.value()
+        elif char == ".":
+            if not isinstance(items[index], dict):
+                items[index] = {}
+            self.key(items[index])
+        elif char == "[":
+            current = items[index]
+            items[index] = self.list_index(current if isinstance(current, list) else [])
+        else:
+            raise UnsupportedValues(f"unexpected {char!r} after list index in {self.chars!r}")
+        return items
+
+
+def set_value(data: dict, expression: str, string: bool = False):
+    """Apply a --set (or --set-string) expression to data, in place"""
+    _SetParser(expression, string).parse(data)
+
+
+def merge(values_files: list, set_values: list = (), set_string_values: list = ()) -> dict:
+    values = {}
+    for path in values_files:
+        values = merge_values(values, load_values_file(path))
+    for expression in set_values:
+        set_value(values, expression)
+    for expression in set_string_values:
+        set_value(values, expression, string=True)
+    if isinstance(values.get("aladdin"), dict) and values["aladdin"].get("templateValues"):
+        # the merger chart renders the values with tpl, only helm can do that
+        raise UnsupportedValues("aladdin.templateValues needs helm's tpl")
+    return values
+
+
+def render(helm_args: list) -> str:
+    """
+    The output of "helm template charts/merger *helm_args", helm_args being --values,
+    --set, --set-string and --namespace arguments
+    """
+    values_files, set_values, set_string_values = [], [], []
+    options = {
+        "--values": values_files,
+        "-f": values_files,
+        "--set": set_values,
+        "--set-string": set_string_values,
+    }
+    args = iter(helm_args)
+    for arg in args:
+        name, equal, value = arg.partition("=")
+        if name == "--namespace" or name == "-n":
+            if not equal:
+                next(args, None)
+            continue
+        if name not in options:
+            raise UnsupportedValues(f"unsupported helm argument {arg}")
+        if not equal:
+            value = next(args, None)
+            if value is None:
+                raise UnsupportedValues(f"{arg} has no value")
+        options[name].append(value)
+
+    values = merge(values_files, set_values, set_string_values)
+    if not values:
+        return TEMPLATE_HEADER + "{}\n"
+    return TEMPLATE_HEADER + yaml.safe_dump(values, default_flow_style=False, allow_unicode=True)
@@ -0,0 +1,169 @@
+"""
+Precompiled manifest of the aladdin commands
+
+The manifest lists the python commands, the bash container and host commands and the
+plugins found in ALADDIN_PLUGIN_DIR, along with their help text and dispatch target, so that
+both the python cli and the bash dispatchers (aladdin.sh and aladdin-container.sh) can
+resolve a command with a single file read.
+
+The built-in part of the manifest is generated at build time with:
+
+    python -m aladdin.lib.manifest
+
+The runtime manifest (built-in commands + plugins) is cached under ~/.aladdin/cache and
+regenerated whenever the aladdin version or the plugin directory's mtime changes.
+
+Targets are relative paths (to ALADDIN_DIR for built-in commands and to ALADDIN_PLUGIN_DIR
+for plugins), so the same manifest is valid on the host and in the aladdin container.
+"""
+import json
+import os
+import pathlib
+import sys
+from contextlib import suppress
+
+from aladdin import __version__
+from aladdin.config import ALADDIN_DEV, PROJECT_ROOT
+from aladdin.lib.command_registry import PYTHON_COMMANDS
+
+MANIFEST_VERSION = 1
+BUILTIN_MANIFEST_PATH = PROJECT_ROOT / "command_manifest.json"
+MANIFEST_CACHE_PATH = pathlib.Path.home() / ".aladdin" / "cache" / "command_manifest.json"
+PLUGIN_HELP = "Plugin command from your aladdin plugin directory"
+
+_manifest = None
+
+
+def build_builtin_manifest() -> dict:
+    """Compute the manifest of the commands shipped with aladdin"""
+    with open(PROJECT_ROOT / "bash_help.json") as bash_help_file:
+        bash_cmd_helps = json.load(bash_help_file)
+
+    commands = {}
+    for side in ["container", "host"]:
+        for name, target in _find_executables(PROJECT_ROOT / "bash", side):
+            command = commands.setdefault(name, {"help": ""})
+            command["help"] = bash_cmd_helps.get(name, {}).get("help", command["help"])
+            command[side] = {"kind": "command", "target": f"bash/{target}"}
+
+    # python commands take precedence over bash container commands
+    for python_command in PYTHON_COMMANDS:
+        command = commands.setdefault(python_command.name, {})
+        command["help"] = python_command.help
+        command["container"] = {"kind": "python", "target": python_command.module}
+
+    return {
+        "version": MANIFEST_VERSION,
+        "aladdin_version": __version__,
+        "commands": dict(sorted(commands.items())),
+    }
+
+
+def build_manifest(plugin_dir: str = None) -> dict:
+    """Compute the manifest of the built-in commands and the plugins in plugin_dir"""
+    manifest = _load_builtin_manifest()
+    manifest["plugin_signature"] = _plugin_signature(plugin_dir)
+    commands = manifest["commands"]
+    for side in ["container", "host"]:
+        for name, target in _find_executables(plugin_dir, side) if plugin_dir else []:
+            command = commands.setdefault(name, {"help": PLUGIN_HELP})
+            # built-in commands take precedence over plugins
+            command.setdefault(side, {"kind": "plugin", "target": target})
+    manifest["commands"] = dict(sorted(commands.items()))
+    return manifest
+
+
+def load_manifest() -> dict:
+    """
+    Load the runtime manifest from the cache, regenerating it if it is out of date
+    """
+    global _manifest
+    plugin_dir = os.getenv("ALADDIN_PLUGIN_DIR")
+    if _manifest and _is_current(_manifest, plugin_dir):
+        return _manifest
+
+    manifest = None
+    if not ALADDIN_DEV:
+        try:
+            with open(MANIFEST_CACHE_PATH) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            pass
+
+    if not manifest or not _is_current(manifest, plugin_dir):
+        manifest = build_manifest(plugin_dir)
+        with suppress(OSError):
+            # The manifest is only a cache, commands can still be resolved without it
+            _write_manifest(manifest, MANIFEST_CACHE_PATH)
+
+    _manifest = manifest
+    return manifest
+
+
+def _is_current(manifest: dict, plugin_dir: str) -> bool:
+    current = (
+        manifest.get("version") == MANIFEST_VERSION
+        and manifest.get("aladdin_version") == __version__
+    )
+    if plugin_dir is None:
+        # The plugin directory is not configured yet (it is only set after the command
+        # line has been parsed), trust the plugins from the cached manifest
+        return current
+    return current and manifest.get("plugin_signature") == _plugin_signature(plugin_dir)
+
+
+def _load_builtin_manifest() -> dict:
+    if not ALADDIN_DEV:
+        try:
+            with open(BUILTIN_MANIFEST_PATH) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("aladdin_version") == __version__:
+                return manifest
+        except (OSError, ValueError):
+            pass
+    return build_builtin_manifest()
+
+
+def _plugin_signature(plugin_dir):
+    """
+    The mtimes of the plugin directory and its host/container sub directories
+
+    Adding or removing a plugin changes the mtime of one of these directories
+    """
+    if not plugin_dir:
+        return None
+    signature = []
+    for path in [plugin_dir, *(os.path.join(plugin_dir, side) for side in ["container", "host"])]:
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def _find_executables(root, side):
+    """Yield (name, relative target) for each "<side>/<name>/<name>" executable in root"""
+    side_dir = os.path.join(root, side)
+    try:
+        names = sorted(os.listdir(side_dir))
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(side_dir, name, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            yield name, f"{side}/{name}/{name}"
+
+
+def _write_manifest(manifest: dict, path: pathlib.Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial manifest
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+        manifest_file.write("\n")
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    output = pathlib.Path(sys.argv[1]) if sys.argv[1:] else BUILTIN_MANIFEST_PATH
+    _write_manifest(build_builtin_manifest(), output)
@@ -0,0 +1,143 @@
+"""
+Run tasks in forked processes, a bounded number at a time, in the order of their dependencies
+
+cluster-init and namespace-init use it to deploy several projects at once: a deploy changes
+the working directory and uses process wide singletons (ProjectConf), so deploys can't
+share a process. Each task gets a fresh fork of the parent process.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from multiprocessing.connection import wait
+from typing import Callable, List
+
+from aladdin.lib import logging, tracing
+
+logger = logging.getLogger(__name__)
+
+# func is None for tasks that have nothing to do (e.g. a project that is already installed),
+# they still satisfy the dependencies of the other tasks
+Task = namedtuple("Task", ["name", "func", "depends_on"])
+TaskResult = namedtuple("TaskResult", ["name", "status", "duration"])
+
+SUCCEEDED = "succeeded"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class DependencyError(Exception):
+    pass
+
+
+def check_dependencies(tasks: List[Task]):
+    """Raise DependencyError if a task depends on an unknown task or on itself (even indirectly)"""
+    depends_on = {task.name: set(task.depends_on) for task in tasks}
+    for name, dependencies in depends_on.items():
+        unknown = dependencies - depends_on.keys()
+        if unknown:
+            raise DependencyError(f"{name} depends on unknown {', '.join(sorted(unknown))}")
+
+    resolved = set()
+    while len(resolved) < len(depends_on):
+        ready = {
+            name for name, deps in depends_on.items() if name not in resolved and deps <= resolved
+        }
+        if not ready:
+            cycle = sorted(depends_on.keys() - resolved)
+            raise DependencyError(f"circular dependencies between {', '.join(cycle)}")
+        resolved |= ready
+
+
+def _run_task(name: str, func: Callable, output_path: str):
+    if output_path:
+        # the output is shown once the task is done, so it doesn't interleave with the others
+        output = os.open(output_path, os.O_WRONLY)
+        os.dup2(output, sys.stdout.fileno())
+        os.dup2(output, sys.stderr.fileno())
+    try:
+        with tracing.span(name, "task"):
+            func()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def run(tasks: List[Task], jobs: int = 1, continue_on_error: bool = False) -> List[TaskResult]:
+    """
+    Run the tasks, up to "jobs" at a time, a task only starts once its dependencies succeeded
+
+    After a failure, no new task is started unless continue_on_error is set (the running
+    tasks are left to finish), the tasks that can't run are reported as skipped
+    """
+    check_dependencies(tasks)
+    context = multiprocessing.get_context("fork")
+    buffered = jobs > 1
+    pending = {task.name: task for task in tasks}
+    results = {}
+    running = {}
+    failed = False
+
+    def satisfied(name):
+        return name in results and results[name].status in [SUCCEEDED, UNCHANGED]
+
+    while pending or running:
+        for name, task in list(pending.items()):
+            blocked = any(
+                dependency in results and not satisfied(dependency)
+                for dependency in task.depends_on
+            )
+            if task.func is None:
+                results[name] = TaskResult(name, UNCHANGED, 0)
+                del pending[name]
+            elif blocked or (failed and not continue_on_error):
+                logger.warning("Skipping %s", name)
+                results[name] = TaskResult(name, SKIPPED, 0)
+                del pending[name]
+
+        ready = [
+            task for task in pending.values()
+            if all(satisfied(dependency) for dependency in task.depends_on)
+        ]
+        for task in ready[: max(jobs - len(running), 0)]:
+            del pending[task.name]
+            output_path = None
+            if buffered:
+                output_fd, output_path = tempfile.mkstemp(prefix=f"aladdin-{task.name}-")
+                os.close(output_fd)
+            logger.info("Starting %s", task.name)
+            process = context.Process(target=_run_task, args=(task.name, task.func, output_path))
+            process.start()
+            running[process.sentinel] = (task, process, time.time(), output_path)
+
+        if not running:
+            if pending:
+                # the dependencies have been checked, nothing should be left waiting
+                raise DependencyError(f"can't run {', '.join(sorted(pending))}")
+            break
+
+        for sentinel in wait(list(running)):
+            task, process, start, output_path = running.pop(sentinel)
+            process.join()
+            if output_path:
+                with open(output_path) as output_file:
+                    sys.stdout.write(f"==> {task.name}\n{output_file.read()}")
+                    sys.stdout.flush()
+                os.unlink(output_path)
+            status = SUCCEEDED if process.exitcode == 0 else FAILED
+            failed = failed or status == FAILED
+            results[task.name] = TaskResult(task.name, status, time.time() - start)
+            log = logger.info if status == SUCCEEDED else logger.error
+            log("%s %s in %.1fs", task.name, status, results[task.name].duration)
+
+    return [results[task.name] for task in tasks]
+
+
+def log_summary(results: List[TaskResult]):
+    for result in results:
+        log = logger.error if result.status == FAILED else logger.info
+        duration = f" in {result.duration:.1f}s" if result.duration else ""
+        log("  %s: %s%s", result.name, result.status, duration)
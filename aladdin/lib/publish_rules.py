@@ -1,6 +1,7 @@
 import boto3
 
 from aladdin.config import load_publish_configs
+from aladdin.lib import tracing
 from aladdin.lib.utils import singleton
 
 
@@ -8,5 +9,7 @@ from aladdin.lib.utils import singleton
 class PublishRules:
     def __init__(self):
         publish_configs = load_publish_configs()
-        boto = boto3.Session(profile_name=publish_configs["aws_profile"])
+        boto = tracing.trace_boto_session(
+            boto3.Session(profile_name=publish_configs["aws_profile"])
+        )
         self.ecr = boto.client("ecr")
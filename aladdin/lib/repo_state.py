@@ -0,0 +1,167 @@
+"""
+Read the state of a git repository without running git
+
+The toplevel, HEAD hash and origin url are read directly from the .git directory
+(HEAD, loose refs, packed-refs and config, following worktrees' commondir),
+only the dirty status needs a "git status". States are memoized per toplevel.
+
+Anything this reader doesn't understand (GIT_DIR/GIT_WORK_TREE overrides, reftable refs,
+core.worktree...) makes RepoState.current() return None, and callers use git instead.
+"""
+import os
+import re
+import subprocess
+import threading
+from contextlib import suppress
+
+try:
+    from functools import cached_property
+except ImportError:
+    # Running on pre-3.8 Python; use backport
+    from backports.cached_property import cached_property
+
+_HASH_RE = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+
+class UnsupportedRepo(Exception):
+    pass
+
+
+class RepoState:
+    _states = {}
+    _lock = threading.Lock()
+
+    def __init__(self, toplevel, git_dir):
+        self.toplevel = toplevel
+        self.git_dir = git_dir
+        self.common_dir = git_dir
+        commondir_file = os.path.join(git_dir, "commondir")
+        if os.path.isfile(commondir_file):
+            self.common_dir = os.path.normpath(
+                os.path.join(git_dir, _read(commondir_file).strip())
+            )
+        self.config = _read_config(os.path.join(self.common_dir, "config"))
+        if self.config.get(("extensions", None, "worktreeconfig"), "false").lower() == "true":
+            with suppress(FileNotFoundError):
+                self.config.update(_read_config(os.path.join(git_dir, "config.worktree")))
+        if self.config.get(("extensions", None, "refstorage"), "files") != "files":
+            raise UnsupportedRepo("unsupported ref storage")
+        if ("core", None, "worktree") in self.config:
+            raise UnsupportedRepo("core.worktree is set")
+        self.origin_url = self.config.get(("remote", "origin", "url"))
+        self.head = self._resolve("HEAD")
+
+    @classmethod
+    def current(cls, path="."):
+        """The state of the repository containing path, None if it can't be read without git"""
+        if os.getenv("GIT_DIR") or os.getenv("GIT_WORK_TREE"):
+            return None
+        try:
+            toplevel, git_dir = _find_repo(os.path.abspath(path))
+        except (OSError, UnsupportedRepo):
+            return None
+        with cls._lock:
+            state = cls._states.get(toplevel)
+        if state is None:
+            try:
+                state = cls(toplevel, git_dir)
+            except (OSError, UnsupportedRepo):
+                return None
+            with cls._lock:
+                state = cls._states.setdefault(toplevel, state)
+        return state
+
+    @classmethod
+    def invalidate(cls):
+        """Forget the memoized states, to be called after checking out another ref"""
+        with cls._lock:
+            cls._states.clear()
+
+    @cached_property
+    def clean(self) -> bool:
+        """Whether the tracked files have no uncommitted (staged or unstaged) changes"""
+        output = subprocess.check_output(
+            ["git", "status", "--porcelain=v2", "--untracked-files=no"],
+            cwd=self.toplevel,
+            encoding="utf-8",
+        )
+        return not output.strip()
+
+    def _resolve(self, ref, depth=0):
+        if depth > 5:
+            raise UnsupportedRepo(f"too many levels of symbolic refs for {ref}")
+        # HEAD (and other pseudo refs) belong to the worktree, the other refs are shared
+        ref_dir = self.git_dir if "/" not in ref else self.common_dir
+        try:
+            value = _read(os.path.join(ref_dir, ref)).strip()
+        except FileNotFoundError:
+            value = self._packed_refs().get(ref)
+        if value is None:
+            # unborn branch
+            return None
+        if value.startswith("ref:"):
+            return self._resolve(value[len("ref:"):].strip(), depth + 1)
+        if not _HASH_RE.match(value):
+            raise UnsupportedRepo(f"unexpected value for {ref}")
+        return value
+
+    def _packed_refs(self):
+        refs = {}
+        try:
+            content = _read(os.path.join(self.common_dir, "packed-refs"))
+        except FileNotFoundError:
+            return refs
+        for line in content.splitlines():
+            if not line or line.startswith(("#", "^")):
+                continue
+            githash, _, name = line.partition(" ")
+            refs[name.strip()] = githash
+        return refs
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _find_repo(path):
+    """Return the (toplevel, git dir) of the repository containing path"""
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return path, dot_git
+        if os.path.isfile(dot_git):
+            # worktrees and submodules have a "gitdir: <path>" file
+            content = _read(dot_git).strip()
+            if not content.startswith("gitdir:"):
+                raise UnsupportedRepo(f"unexpected {dot_git}")
+            git_dir = os.path.join(path, content[len("gitdir:"):].strip())
+            return path, os.path.normpath(git_dir)
+        parent = os.path.dirname(path)
+        if parent == path:
+            raise UnsupportedRepo("not a git repository")
+        path = parent
+
+
+def _read_config(path):
+    """
+    Parse a git config file into {(section, subsection, key): value}
+
+    Only handles what git writes itself (no includes, no multi-line values)
+    """
+    config = {}
+    section = subsection = None
+    for line in _read(path).splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        match = re.match(r'^\[([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\]$', line)
+        if match:
+            section = match.group(1).lower()
+            subsection = match.group(2)
+            if section in ["include", "includeif"]:
+                raise UnsupportedRepo("config includes")
+            continue
+        key, _, value = line.partition("=")
+        config[(section, subsection, key.strip().lower())] = value.strip().strip('"')
+    return config
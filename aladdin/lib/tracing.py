@@ -0,0 +1,378 @@
+"""
+Trace aladdin's external calls: subprocesses (helm, kubectl, git, docker...), boto and
+kubernetes API calls
+
+Enabled with "aladdin --trace <command>" or ALADDIN_TRACE=true. Every call is recorded as a
+span (name, duration, exit code or http status, bytes in and out). Spans are Chrome "complete"
+events: the trace viewers nest them by time within a thread, under the aladdin command and
+the steps recorded with span() (e.g. clone_and_checkout). When the command exits, the trace
+is written to ~/.aladdin/traces as Chrome trace-event JSON (open it in chrome://tracing or
+https://ui.perfetto.dev) and a summary of the time spent per call is logged.
+
+Spans are appended to an events file as soon as they end, so processes forked by the
+command (see process_pool) and the aladdin commands it runs (e.g. helm-values as a helm
+plugin) add their spans to the same trace.
+"""
+import atexit
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from aladdin.lib import logging
+from aladdin.lib.utils import strtobool
+
+logger = logging.getLogger(__name__)
+
+TRACES_DIR = Path.home() / ".aladdin" / "traces"
+# set by the process that owns the trace, the processes it starts append to the same file
+EVENTS_ENV = "ALADDIN_TRACE_EVENTS"
+MAX_COMMAND_LENGTH = 500
+# options whose value is not the name of a subcommand, or shouldn't end up in a trace
+_OPTIONS_WITH_VALUE = {"-c", "-C", "-n", "--namespace", "--kubeconfig", "--context"}
+_SECRET_OPTIONS = {"-p", "--password"}
+
+_write_lock = threading.Lock()
+_events_path = None
+_owner = None
+_root = None
+
+
+def enabled() -> bool:
+    return _events_path is not None
+
+
+def _configured() -> bool:
+    return strtobool(os.getenv("ALADDIN_TRACE", "false")) or bool(os.getenv(EVENTS_ENV))
+
+
+class Span:
+    def __init__(self, name: str, category: str, **args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.time()
+        self.ended = False
+
+    def end(self, **args):
+        if self.ended:
+            return
+        self.ended = True
+        duration = time.time() - self.start
+        self.args.update(args)
+        _write({
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": int(self.start * 1e6),
+            "dur": int(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {key: value for key, value in self.args.items() if value is not None},
+        })
+
+
+def _write(event: dict):
+    if not enabled():
+        return
+    line = json.dumps(event, default=str) + "\n"
+    with _write_lock:
+        try:
+            with open(_events_path, "a") as events_file:
+                events_file.write(line)
+        except OSError as e:
+            logger.debug("Could not record %s: %s", event["name"], e)
+
+
+@contextmanager
+def span(name: str, category: str = "aladdin", **args):
+    """Record the duration of a block, does nothing if tracing is disabled"""
+    if not enabled():
+        yield None
+        return
+    current = Span(name, category, **args)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=type(e).__name__)
+        raise
+    current.end()
+
+
+def traced(func=None, name=None):
+    """Decorator recording a span for each call of func"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            with span(name or func.__qualname__):
+                return func(*args, **kwargs)
+
+        return _wrapper
+
+    if not func:
+        return decorator
+    return decorator(func)
+
+
+def start(command: str):
+    """
+    Start tracing the aladdin command if ALADDIN_TRACE is set: record its subprocesses and
+    write the trace when the process exits
+    """
+    global _events_path, _owner, _root
+    if enabled() or not _configured():
+        return
+    _events_path = os.getenv(EVENTS_ENV)
+    if not _events_path:
+        TRACES_DIR.mkdir(parents=True, exist_ok=True)
+        name = f"{command or 'aladdin'}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        _events_path = str(TRACES_DIR / f".{name}.events")
+        _owner = os.getpid()
+        os.environ[EVENTS_ENV] = _events_path
+    atexit.register(finish)
+    subprocess.Popen = TracedPopen
+    _write({
+        "name": "process_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "args": {"name": f"aladdin {command}"},
+    })
+    # the root span, closed by finish()
+    _root = Span(f"aladdin {command}", "command", argv=_command_line(sys.argv))
+
+
+def finish():
+    """
+    Stop tracing, the process that owns the trace also writes it and logs its summary
+    (to be called before exec'ing another program, otherwise done when the process exits)
+    """
+    global _events_path, _owner, _root
+    if not enabled():
+        return
+    if _root is not None:
+        _root.end()
+    events_path, owner = _events_path, _owner
+    _events_path = _owner = _root = None
+    subprocess.Popen = _Popen
+    if owner != os.getpid():
+        return
+    os.environ.pop(EVENTS_ENV, None)
+    try:
+        with open(events_path) as events_file:
+            events = [json.loads(line) for line in events_file if line.strip()]
+        events_file_path = Path(events_path)
+        trace_path = events_file_path.with_name(events_file_path.name[1:-len(".events")] + ".json")
+        with open(trace_path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+        events_file_path.unlink()
+    except (OSError, ValueError) as e:
+        logger.warning("Could not write the trace: %s", e)
+        return
+    log_summary(events)
+    logger.info("Trace written to %s", trace_path)
+
+
+def summarize(events: list) -> list:
+    """[(category, name, calls, failures, total seconds, max seconds, bytes in, bytes out)]"""
+    totals = defaultdict(lambda: [0, 0, 0.0, 0.0, 0, 0])
+    for event in events:
+        if event.get("ph") != "X" or event.get("cat") == "command":
+            continue
+        args = event.get("args", {})
+        total = totals[(event["cat"], event["name"])]
+        total[0] += 1
+        failed = args.get("exit_code") not in [None, 0] or args.get("status", 0) >= 400
+        total[1] += bool(failed or "error" in args)
+        total[2] += event["dur"] / 1e6
+        total[3] = max(total[3], event["dur"] / 1e6)
+        total[4] += args.get("bytes_in", 0)
+        total[5] += args.get("bytes_out", 0)
+    rows = [(*key, *values) for key, values in totals.items()]
+    return sorted(rows, key=lambda row: row[4], reverse=True)
+
+
+def log_summary(events: list):
+    for event in events:
+        if event.get("cat") == "command" and event.get("ph") == "X":
+            logger.info("%s: %.1fs (pid %s)", event["name"], event["dur"] / 1e6, event["pid"])
+    rows = summarize(events)
+    if not rows:
+        return
+    logger.info(
+        "%-12s %-40s %6s %6s %9s %8s %10s %10s",
+        "kind", "call", "calls", "failed", "total", "max", "bytes in", "bytes out",
+    )
+    for category, name, calls, failures, total, longest, bytes_in, bytes_out in rows:
+        logger.info(
+            "%-12s %-40s %6d %6d %8.2fs %7.2fs %10d %10d",
+            category, name[:40], calls, failures, total, longest, bytes_in, bytes_out,
+        )
+
+
+def _command_line(args) -> str:
+    """The command line, without secrets and truncated"""
+    if isinstance(args, (str, bytes, os.PathLike)):
+        args = os.fsdecode(args).split()
+    args = [os.fsdecode(arg) if isinstance(arg, (bytes, os.PathLike)) else str(arg) for arg in args]
+    redacted = []
+    for i, arg in enumerate(args):
+        redacted.append("***" if i > 0 and args[i - 1] in _SECRET_OPTIONS else arg)
+    command = " ".join(redacted)
+    if len(command) > MAX_COMMAND_LENGTH:
+        command = command[:MAX_COMMAND_LENGTH] + "..."
+    return command
+
+
+def _command_name(args, shell=False) -> str:
+    """The program and its subcommand, e.g. "git ls-remote" or "helm upgrade" """
+    if isinstance(args, (str, bytes, os.PathLike)):
+        args = os.fsdecode(args).split() if shell else [os.fsdecode(args)]
+    args = [os.fsdecode(arg) if isinstance(arg, (bytes, os.PathLike)) else str(arg) for arg in args]
+    if not args:
+        return "?"
+    name = os.path.basename(args[0])
+    skip = False
+    for arg in args[1:]:
+        if skip:
+            skip = False
+        elif arg in _OPTIONS_WITH_VALUE:
+            skip = True
+        elif not arg.startswith("-") and "=" not in arg and "/" not in arg:
+            return f"{name} {arg}"
+    return name
+
+
+_Popen = subprocess.Popen
+
+
+class TracedPopen(_Popen):
+    """
+    subprocess.Popen recording a span for each process, installed by start(): subprocess.run,
+    check_output... and the libraries (e.g. the kubeconfig exec plugins) all use it
+    """
+
+    def __init__(self, args, *popen_args, **kwargs):
+        self._communicating = False
+        self._span = Span(
+            _command_name(args, kwargs.get("shell", False)),
+            "subprocess",
+            command=_command_line(args),
+        )
+        try:
+            super().__init__(args, *popen_args, **kwargs)
+        except BaseException as e:
+            self._span.end(error=type(e).__name__)
+            raise
+
+    def communicate(self, input=None, timeout=None):
+        # communicate() waits for the process, the span ends once the bytes are known
+        self._communicating = True
+        try:
+            stdout, stderr = super().communicate(input, timeout)
+        finally:
+            self._communicating = False
+        self._span.args["bytes_in"] = len(input or "")
+        self._span.args["bytes_out"] = len(stdout or "") + len(stderr or "")
+        self._end()
+        return stdout, stderr
+
+    def wait(self, timeout=None):
+        returncode = super().wait(timeout)
+        self._end()
+        return returncode
+
+    def poll(self):
+        returncode = super().poll()
+        if returncode is not None:
+            self._end()
+        return returncode
+
+    def _end(self):
+        if self.returncode is not None and not self._communicating:
+            self._span.end(exit_code=self.returncode)
+
+
+def trace_boto_session(session):
+    """Record a span for each API call made with the boto3 session's clients"""
+    if not enabled():
+        return session
+    events = session.events
+
+    def before_parameter_build(model, context, **kwargs):
+        context["aladdin_span"] = Span(
+            f"{model.service_model.endpoint_prefix} {model.name}", "aws"
+        )
+
+    def request_created(request, **kwargs):
+        current = getattr(request, "context", {}).get("aladdin_span")
+        if current is not None:
+            current.args["bytes_in"] = len(request.body or b"")
+
+    def after_call(http_response, model, context, **kwargs):
+        current = context.pop("aladdin_span", None)
+        if current is not None:
+            length = http_response.headers.get("content-length")
+            current.end(
+                status=http_response.status_code, bytes_out=int(length) if length else None
+            )
+
+    def after_call_error(exception, context, **kwargs):
+        current = context.pop("aladdin_span", None)
+        if current is not None:
+            current.end(error=type(exception).__name__)
+
+    # the first event of an API call
+    events.register(
+        "before-parameter-build", before_parameter_build, unique_id="aladdin-trace-start"
+    )
+    events.register("request-created", request_created, unique_id="aladdin-trace-request")
+    events.register("after-call", after_call, unique_id="aladdin-trace-after-call")
+    events.register("after-call-error", after_call_error, unique_id="aladdin-trace-error")
+    return session
+
+
+def trace_kubernetes(api_client):
+    """Record a span for each request made with the kubernetes ApiClient"""
+    if not enabled() or getattr(api_client.rest_client, "_aladdin_traced", False):
+        return api_client
+    rest_client = api_client.rest_client
+    request = rest_client.request
+
+    @functools.wraps(request)
+    def traced_request(method, url, *args, body=None, **kwargs):
+        path = url.split("://", 1)[-1].partition("/")[2].partition("?")[0]
+        current = Span(
+            f"{method} {_api_path_pattern(path)}",
+            "kubernetes",
+            url=url,
+            bytes_in=len(json.dumps(body, default=str)) if body is not None else 0,
+        )
+        try:
+            response = request(method, url, *args, body=body, **kwargs)
+        except BaseException as e:
+            current.end(status=getattr(e, "status", None), error=type(e).__name__)
+            raise
+        data = getattr(response, "data", None)
+        current.end(status=response.status, bytes_out=len(data) if data else None)
+        return response
+
+    rest_client.request = traced_request
+    rest_client._aladdin_traced = True
+    return api_client
+
+
+def _api_path_pattern(path: str) -> str:
+    """Group the requests of a kind: /api/v1/namespaces/x/pods/y -> /api/v1/namespaces/*/pods/*"""
+    parts = path.split("/")
+    # /api/<version>/<resource>/<name>... or /apis/<group>/<version>/<resource>/<name>...
+    first = 2 if parts[0] == "api" else 3
+    for i in range(first + 1, len(parts), 2):
+        parts[i] = "*"
+    return "/" + "/".join(parts)
@@ -7,35 +7,15 @@ import coloredlogs
 import verboselogs
 
 from aladdin import env
-from aladdin.commands import (
-    build,
-    build_components,
-    cluster_init,
-    cmd,
-    connect,
-    deploy,
-    environment,
-    get_certificate,
-    helm_values,
-    namespace_init,
-    publish,
-    refresh,
-    restart,
-    rollback,
-    scale,
-    start,
-    stop,
-    sync_ingress,
-    tail,
-    undeploy,
-    version,
-)
 from aladdin.lib.arg_tools import (
     EnvStoreAction,
     EnvStoreTrueAction,
     bash_wrapper,
     get_bash_commands,
 )
+from aladdin.lib import tracing
+from aladdin.lib.command_registry import get_python_commands
+from aladdin.lib.manifest import load_manifest
 
 
 def cli():
@@ -50,41 +30,19 @@ def cli():
         exit_on_error=False,
     )
     subparsers = parser.add_subparsers(help="aladdin commands")
-    subcommands = [
-        build,
-        build_components,
-        cluster_init,
-        cmd,
-        connect,
-        deploy,
-        environment,
-        get_certificate,
-        helm_values,
-        namespace_init,
-        publish,
-        refresh,
-        restart,
-        rollback,
-        scale,
-        start,
-        stop,
-        sync_ingress,
-        tail,
-        undeploy,
-        version,
-    ]
 
+    cmd_args = list(filter(lambda arg: not arg.startswith("-"), sys.argv[1:]))
+    command = cmd_args[0] if cmd_args else None
+
+    # Only the selected command module gets imported, the other python commands
+    # are added from the command registry for help visibility
+    subcommands = get_python_commands(selected=command)
+    python_command_names = list(map(lambda arg: arg[0], subcommands))
     # We want to have python help include host commands that run in bash portion of aladdin
     # Create list of tuples going from command name to parse args function
-    subcommands = [
-        (subcommand.__name__.split(".")[-1], subcommand.parse_args)
-        for subcommand in subcommands
-    ]
-    bash_commands = get_bash_commands()
-    bash_command_names = list(map(lambda arg: arg[0], bash_commands))
-    subcommands.extend(bash_commands)
+    subcommands.extend(get_bash_commands())
     # Alphabetize the list
-    subcommands.sort()
+    subcommands.sort(key=lambda arg: arg[0])
     # Add all subcommands in alphabetical order
     for subcommand in map(lambda arg: arg[1], subcommands):
         subcommand(subparsers)
@@ -121,6 +79,23 @@ def cli():
         default=False,
         action=EnvStoreTrueAction,
     )
+    parser.add_argument(
+        "--refresh-config",
+        help="Fetch the config and plugin repos even if they were fetched recently",
+        dest="REFRESH_CONFIG",
+        default=False,
+        action=EnvStoreTrueAction,
+    )
+    parser.add_argument(
+        "--trace",
+        help=(
+            "Record the duration of the external calls (helm, kubectl, git, aws, kubernetes) "
+            "in ~/.aladdin/traces and log a summary, also enabled by ALADDIN_TRACE=true"
+        ),
+        dest="ALADDIN_TRACE",
+        default=False,
+        action=EnvStoreTrueAction,
+    )
 
     # Initialize logging across python
     verboselogs.install()
@@ -152,28 +127,27 @@ def cli():
     if not sys.argv[1:] or sys.argv[1] in ["-h", "--help"]:
         return parser.print_help()
 
-    cmd_args = list(filter(lambda arg: not arg.startswith("-"), sys.argv[1:]))
-    command = cmd_args[0] if cmd_args else None
+    with contextlib.suppress(argparse.ArgumentError):
+        # loads up arguments and stores them as env variables
+        # fails if the command is bash or plugin, but we still
+        # want the env variables to get configured
+        parser.parse_known_args()
+
+    tracing.start(command)
 
     # ordering here is important
     # don't try to set config_path if the user is trying
     # to configure the aladdin config
     if command != "config" and not env.set_config_path():
         return sys.exit(1)
-
-    with contextlib.suppress(argparse.ArgumentError):
-        # loads up arguments and stores them as env variables
-        # fails if the command is bash or plugin, but we still
-        # want the env variables to get configured
-        parser.parse_known_args()
     env.configure_env()
 
-    # if it's not a command we know about it might be a plugin
-    # currently the bash scripts handle plugins
-    if not command or command not in subparsers._name_parser_map:
-        return bash_wrapper()
-
-    if command and command in bash_command_names:
+    # if it's not a python command it's either a bash command, a plugin
+    # or a command we don't know about, the bash scripts handle those
+    if command not in python_command_names:
+        # ALADDIN_PLUGIN_DIR is now configured, make sure the command manifest
+        # used by the bash scripts is up to date
+        load_manifest()
         return bash_wrapper()
 
     args = parser.parse_args()
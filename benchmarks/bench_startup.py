@@ -0,0 +1,389 @@
+"""
+Benchmarks of aladdin's own overhead (cli startup, config resolution, helm values)
+
+Each scenario runs in a fresh python process against the config-example/ directory, with
+a throwaway HOME and kubeconfig, so no network access or aladdin setup is needed.
+For each scenario we report the best wall time, the import time (from -X importtime)
+and the peak RSS of the process.
+
+The numbers depend on the machine, so they are compared with a baseline measured on the same
+machine: either the code of another git ref, checked out in a worktree and benchmarked in the
+same run, or the baselines previously saved on this machine (benchmarks/baselines.json, not
+committed).
+
+Usage:
+
+    python benchmarks/bench_startup.py --against main   # compare against the main branch
+    python benchmarks/bench_startup.py --save-baseline  # save this machine's baselines
+    python benchmarks/bench_startup.py                  # compare against the saved baselines
+    python benchmarks/bench_startup.py -s cli-help -r 10 --importtime-top 20
+
+The exit code is 1 if a scenario is slower than its baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+CONFIG_FIXTURE = REPO_ROOT / "config-example"
+# Saved with --save-baseline, only valid on the machine where they were measured (gitignored)
+BASELINES_PATH = pathlib.Path(__file__).resolve().parent / "baselines.json"
+
+KUBECONFIG_FIXTURE = """\
+apiVersion: v1
+kind: Config
+clusters:
+- name: local
+  cluster:
+    server: https://127.0.0.1:6443
+contexts:
+- name: local
+  context:
+    cluster: local
+    namespace: default
+    user: local
+current-context: local
+users:
+- name: local
+  user:
+    token: benchmark
+"""
+
+LAMP_FIXTURE = {
+    "name": "bench",
+    "helm_chart": ["./helm/bench"],
+    "docker_images": ["bench"],
+}
+
+CHART_FIXTURE = """\
+apiVersion: v2
+name: bench
+version: 0.1.0
+"""
+
+# Python code run by each scenario, the "cli" scenarios go through aladdin's entrypoint
+SCENARIOS = {
+    "cli-help": """
+        sys.argv = ["aladdin", "--help"]
+        from aladdin.main import cli
+        cli()
+    """,
+    "cli-version": """
+        sys.argv = ["aladdin", "version"]
+        from aladdin.main import cli
+        cli()
+    """,
+    "configure-env": """
+        from aladdin import env
+        env.configure_env()
+    """,
+    "cluster-rules": """
+        from aladdin.lib.cluster_rules import ClusterRules
+        for cluster in ["LOCAL", "CLUSTERDEV", "CLUSTERPROD"]:
+            ClusterRules(cluster=cluster).values_files
+    """,
+    "helm-rules": """
+        from aladdin.lib.helm_rules import HelmRules
+        HelmRules.get_helm_values()
+    """,
+    "helm-values": """
+        sys.argv = [
+            "aladdin", "helm-values", "aladdin://LOCAL", "--chart", "bench",
+            "--git-ref", os.environ["BENCH_GIT_REF"], "-o", os.devnull,
+        ]
+        from aladdin.main import cli
+        cli()
+    """,
+}
+
+# Scenarios that shell out to these executables are skipped if they are not installed
+SCENARIO_REQUIREMENTS = {
+    "helm-values": ["helm", "git"],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        dest="scenarios",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, can be repeated (default: all scenarios)",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="number of runs per scenario (default: 5)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed relative regression against the baselines (default: 0.25)",
+    )
+    parser.add_argument(
+        "--importtime-top",
+        type=int,
+        default=5,
+        help="number of slowest top-level imports to show per scenario (default: 5)",
+    )
+    parser.add_argument(
+        "--against",
+        metavar="GIT_REF",
+        help="benchmark the code of this git ref in the same run and use it as the baseline",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="record the results as the new baselines"
+    )
+    parser.add_argument("--json", dest="json_output", help="also write the results to this file")
+    return parser.parse_args()
+
+
+def make_fixtures(root: pathlib.Path):
+    """Create the HOME, kubeconfig and project fixtures, return the env of the scenarios"""
+    home = root / "home"
+    (home / ".aladdin" / "config").mkdir(parents=True)
+    # No config/plugin repos: the config dir comes from ALADDIN_CONFIG_DIR
+    (home / ".aladdin" / "config" / "config.json").write_text("{}")
+    kubeconfig = root / "kubeconfig"
+    kubeconfig.write_text(KUBECONFIG_FIXTURE)
+
+    project = root / "bench"
+    chart = project / "helm" / "bench"
+    chart.mkdir(parents=True)
+    (project / "lamp.json").write_text(json.dumps(LAMP_FIXTURE))
+    (chart / "Chart.yaml").write_text(CHART_FIXTURE)
+    (chart / "values.yaml").write_text("replicas: 1\n")
+    (chart / "values.LOCAL.yaml").write_text("replicas: 2\n")
+
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key not in {"NAMESPACE", "HELM_NAMESPACE", "ALADDIN_DEV", "ALADDIN_PLUGIN_DIR"}
+    }
+    env.update(
+        {
+            "HOME": str(home),
+            "KUBECONFIG": str(kubeconfig),
+            "ALADDIN_CONFIG_DIR": str(CONFIG_FIXTURE),
+            "ALADDIN_CONTAINER": "true",
+            "CLUSTER_CODE": "LOCAL",
+            # Make sure nothing reaches out to a git remote
+            "GIT_SSH_COMMAND": "false",
+            "GIT_TERMINAL_PROMPT": "0",
+        }
+    )
+
+    if shutil.which("git"):
+        git_env = dict(
+            env,
+            GIT_AUTHOR_NAME="bench",
+            GIT_AUTHOR_EMAIL="bench@example.com",
+            GIT_COMMITTER_NAME="bench",
+            GIT_COMMITTER_EMAIL="bench@example.com",
+        )
+        for command in [
+            ["git", "init", "-q"],
+            ["git", "remote", "add", "origin", "git@github.com:fivestars-os/bench.git"],
+            ["git", "add", "."],
+            ["git", "commit", "-q", "-m", "bench"],
+        ]:
+            subprocess.run(command, cwd=project, env=git_env, check=True)
+        env["BENCH_GIT_REF"] = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=project, encoding="utf-8"
+        ).strip()
+    return env, project
+
+
+def checkout_worktree(git_ref: str, path: pathlib.Path):
+    """Check out git_ref (detached) in a worktree of this repo, to benchmark its code"""
+    subprocess.run(
+        ["git", "worktree", "add", "--quiet", "--detach", str(path), git_ref],
+        cwd=REPO_ROOT,
+        check=True,
+    )
+
+
+def remove_worktree(path: pathlib.Path):
+    subprocess.run(["git", "worktree", "remove", "--force", str(path)], cwd=REPO_ROOT)
+
+
+def run_scenario(name: str, env: dict, cwd: pathlib.Path, code_root: pathlib.Path):
+    """
+    Run a scenario once with the aladdin package of code_root, return (wall time in s,
+    peak rss in KiB, importtime stderr)
+    """
+    code = "import os, sys\n" + textwrap.dedent(SCENARIOS[name])
+    env = dict(
+        env,
+        PYTHONPATH=os.pathsep.join(filter(None, [str(code_root), env.get("PYTHONPATH")])),
+    )
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        # os.wait4 gives us the resource usage of this child only
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+        process.returncode = (
+            os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        )
+        stderr.seek(0)
+        output = stderr.read().decode("utf-8", errors="replace")
+
+    if process.returncode:
+        errors = "\n".join(
+            line for line in output.splitlines() if not line.startswith("import time:")
+        )
+        raise RuntimeError(f"scenario {name} failed ({process.returncode}):\n{errors}")
+    return wall, rusage.ru_maxrss, output
+
+
+def parse_importtime(output: str):
+    """Return the total import time (in s) and the cumulative time of top-level imports"""
+    total = 0
+    top_level = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        total += int(self_us)
+        # nested imports are indented under their parent
+        if not module[1:].startswith(" "):
+            top_level[module.strip()] = int(cumulative_us) / 1e6
+    return total / 1e6, top_level
+
+
+def benchmark(name: str, cwd: pathlib.Path, repeat: int, targets: list) -> list:
+    """
+    Benchmark the scenario with each of the (code root, env) targets, return their results.
+    The runs of the targets alternate so that they are equally affected by the load of the
+    machine.
+    """
+    # keep the best times, the slower runs only measure noise from the rest of the machine
+    runs = [{"walls": [], "rss": [], "imports": [], "top_level": {}} for _ in targets]
+    for _ in range(repeat):
+        for (code_root, env), run in zip(targets, runs):
+            wall, peak_rss, output = run_scenario(name, env, cwd, code_root)
+            import_time, run["top_level"] = parse_importtime(output)
+            run["walls"].append(wall)
+            run["rss"].append(peak_rss)
+            run["imports"].append(import_time)
+    return [
+        {
+            "wall_ms": round(min(run["walls"]) * 1000, 1),
+            "import_ms": round(min(run["imports"]) * 1000, 1),
+            "peak_rss_kb": max(run["rss"]),
+            "top_imports": {
+                module: round(seconds * 1000, 1)
+                for module, seconds in sorted(run["top_level"].items(), key=lambda item: -item[1])
+            },
+        }
+        for run in runs
+    ]
+
+
+def compare(results: dict, baselines: dict, tolerance: float):
+    """Yield (scenario, metric, baseline, result) for every regression"""
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        for metric in ["wall_ms", "import_ms", "peak_rss_kb"]:
+            if baseline.get(metric) and result[metric] > baseline[metric] * (1 + tolerance):
+                yield name, metric, baseline[metric], result[metric]
+
+
+def run_benchmark(name, project, args, targets, results, baselines):
+    """Benchmark a scenario, print its results against its baseline"""
+    missing = [exe for exe in SCENARIO_REQUIREMENTS.get(name, []) if not shutil.which(exe)]
+    if missing:
+        print(f"{name:<16} skipped, missing: {', '.join(missing)}")
+        return
+    try:
+        result, *against = benchmark(name, project, args.repeat, targets)
+    except RuntimeError as e:
+        if len(targets) == 1:
+            raise
+        # the scenario may not work yet at the baseline ref
+        print(f"{name:<16} no baseline, the scenario failed at {args.against}: {e}")
+        result, *against = benchmark(name, project, args.repeat, targets[:1])
+    results[name] = result
+    if against:
+        baselines[name] = against[0]
+    baseline = baselines.get(name, {})
+    print(
+        f"{name:<16} wall {result['wall_ms']:>8.1f}ms"
+        f" (baseline {baseline.get('wall_ms', '-')})"
+        f"  import {result['import_ms']:>8.1f}ms"
+        f" (baseline {baseline.get('import_ms', '-')})"
+        f"  peak rss {result['peak_rss_kb']:>7}KiB"
+        f" (baseline {baseline.get('peak_rss_kb', '-')})"
+    )
+    for module, cumulative_ms in list(result["top_imports"].items())[: args.importtime_top]:
+        print(f"{'':<18}{cumulative_ms:>8.1f}ms  {module}")
+
+
+def main():
+    args = parse_args()
+    scenarios = args.scenarios or list(SCENARIOS)
+    baselines = {}
+    if args.against:
+        if args.save_baseline:
+            sys.exit("--against and --save-baseline can't be used together")
+    elif BASELINES_PATH.exists():
+        baselines = json.loads(BASELINES_PATH.read_text())
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env, project = make_fixtures(pathlib.Path(tmp_dir))
+        targets = [(REPO_ROOT, env)]
+        if args.against:
+            worktree = pathlib.Path(tmp_dir) / "baseline"
+            checkout_worktree(args.against, worktree)
+            # its own HOME, the caches of one version must not be used by the other
+            home = pathlib.Path(tmp_dir) / "baseline-home"
+            shutil.copytree(env["HOME"], home)
+            targets.append((worktree, dict(env, HOME=str(home))))
+        try:
+            for name in scenarios:
+                run_benchmark(name, project, args, targets, results, baselines)
+        finally:
+            if args.against:
+                remove_worktree(worktree)
+
+    if args.json_output:
+        with open(args.json_output, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    if args.save_baseline:
+        for name, result in results.items():
+            baselines[name] = {
+                metric: result[metric] for metric in ["wall_ms", "import_ms", "peak_rss_kb"]
+            }
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baselines saved in {BASELINES_PATH}")
+        return
+
+    regressions = list(compare(results, baselines, args.tolerance))
+    for name, metric, baseline, result in regressions:
+        print(f"REGRESSION {name}: {metric} {result} > {baseline} (+{args.tolerance:.0%})")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
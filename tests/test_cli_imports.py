@@ -0,0 +1,35 @@
+import subprocess
+import sys
+import unittest
+
+# Slow to import, they should only be loaded by the commands that need them
+HEAVY_MODULES = {"kubernetes", "boto3", "botocore", "yaml"}
+
+
+def imported_modules(*args):
+    """The modules imported by running the aladdin cli with args"""
+    code = (
+        f"import sys; sys.argv = ['aladdin', *{list(args)!r}]; "
+        "from aladdin.main import cli; cli()"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True
+    )
+    # import time: self [us] | cumulative | imported package
+    return {
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+
+
+class TestCliImports(unittest.TestCase):
+    def test_help_does_not_import_heavy_modules(self):
+        modules = imported_modules("--help")
+        self.assertIn("aladdin.main", modules)
+        top_level = {module.split(".")[0] for module in modules}
+        self.assertEqual(top_level & HEAVY_MODULES, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import textwrap
+import unittest
+
+import yaml
+
+from aladdin.config import PROJECT_ROOT
+from aladdin.lib.k8s import values_merge
+
+
+@unittest.skipUnless(shutil.which("helm"), "helm is not installed")
+class TestValuesMergeParity(unittest.TestCase):
+    """values_merge.render must give the values "helm template charts/merger" renders"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def values_file(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w") as values_file:
+            values_file.write(textwrap.dedent(content))
+        return f"--values={path}"
+
+    def assertSameValues(self, helm_args):
+        helm_values = subprocess.run(
+            ["helm", "template", str(PROJECT_ROOT / "charts/merger"), *helm_args],
+            capture_output=True,
+            check=True,
+            encoding="utf-8",
+        ).stdout
+        values = values_merge.render(helm_args)
+        self.assertEqual(yaml.safe_load(values), yaml.safe_load(helm_values))
+
+    def test_nested_set(self):
+        self.assertSameValues(["--set", "a.b.c=1,a.b.d=x", "--set", "a.e=true"])
+
+    def test_list_index(self):
+        self.assertSameValues(["--set", "a[0].b=1,a[2].c=2", "--set", "a[0].d[1]=x"])
+
+    def test_list(self):
+        self.assertSameValues(["--set", "a={x,1,true},b.c={}"])
+
+    def test_escaped_comma_and_dot(self):
+        self.assertSameValues(["--set", r"a\.b=1,c=x\,y", "--set-string", r"d.e\.f=g\,h"])
+
+    def test_null(self):
+        values = self.values_file("values.yaml", "x: 1\ny:\n  z: 2\n")
+        self.assertSameValues([values, "--set", "x=null,y.z=null"])
+
+    def test_set_and_set_string_order(self):
+        self.assertSameValues(
+            ["--set-string", "a=1,b.c=2", "--set", "a=3,b.c=4,d=5", "--set-string", "d=6"]
+        )
+
+    def test_typed_values(self):
+        self.assertSameValues(["--set", "a=0,b=00,c=+5,d=-3,e=1.5,f=False,g=NULL,h=1e3,i=0x10"])
+        self.assertSameValues(["--set-string", "a=0,b=00,c=+5,d=true"])
+
+    def test_values_files_override(self):
+        first = self.values_file(
+            "first.yaml",
+            """
+            a:
+              b: 1
+              c: [1, 2]
+            d:
+              e: x
+            f: 1
+            date: 2020-01-01
+            """,
+        )
+        second = self.values_file(
+            "second.yaml",
+            """
+            a:
+              c: [3]
+              g: null
+            d: scalar
+            f:
+              h: map
+            """,
+        )
+        self.assertSameValues([first, second, "--set", "a.b=2", "--namespace=test"])
+
+
+if __name__ == "__main__":
+    unittest.main()